@@ -0,0 +1,261 @@
+"""Batch-Verarbeitung von Fragen (JSONL rein, JSONL raus).
+
+Jede Eingabezeile ist ein JSON-Objekt mit einer ID (``id``, ``request_id``
+oder ``custom_id``; sonst die Zeilennummer) und der Frage (``question``,
+``prompt`` oder ``body``). Identische Fragen (nach Normalisierung) werden nur
+einmal beantwortet; das Ergebnis geht an alle zugehörigen IDs.
+
+Ergebniszeilen: ``{"id", "question", "answer"}`` bzw. ``{"id", "question",
+"error"}``, in Fertigstellungsreihenfolge. Die Ausgabedatei ist zugleich der
+Checkpoint: ein erneuter Lauf überspringt alle IDs mit Antwort und
+wiederholt nur fehlgeschlagene oder fehlende (spätere Zeilen gelten).
+
+    python batch.py run fragen.jsonl -o antworten.jsonl --concurrency 16
+    python batch.py run fragen.jsonl -o antworten.jsonl --native   # OpenAI Batch API
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+from providers import ProviderError
+from response_cache import normalize_question
+
+BatchItem = namedtuple('BatchItem', ['id', 'question', 'error'])
+
+_ID_FIELDS = ('id', 'request_id', 'custom_id')
+_QUESTION_FIELDS = ('question', 'prompt', 'body')
+NATIVE_DONE_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def parse_items(lines, max_items=None):
+    """JSONL-Zeilen -> Liste von BatchItem (ungültige Zeilen mit ``error``)."""
+    items = []
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        if max_items is not None and len(items) >= max_items:
+            raise ValueError(f"Zu viele Einträge (maximal {max_items})")
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            items.append(BatchItem(str(number), '', f"Ungültiges JSON: {e.msg}"))
+            continue
+        if not isinstance(record, dict):
+            items.append(BatchItem(str(number), '', 'Zeile ist kein JSON-Objekt'))
+            continue
+        item_id = next((record[f] for f in _ID_FIELDS if record.get(f) is not None), number)
+        question = next((record[f] for f in _QUESTION_FIELDS if isinstance(record.get(f), str)), '').strip()
+        items.append(BatchItem(str(item_id), question, None if question else 'Frage fehlt'))
+    return items
+
+
+def group_questions(items):
+    """Dedupliziert: Schlüssel -> (Frage, [BatchItem]) in Eingabereihenfolge."""
+    groups = OrderedDict()
+    for item in items:
+        if item.error:
+            continue
+        key = hashlib.sha1(normalize_question(item.question).encode('utf-8')).hexdigest()
+        if key in groups:
+            groups[key][1].append(item)
+        else:
+            groups[key] = (item.question, [item])
+    return groups
+
+
+def _results(items, answer=None, error=None):
+    for item in items:
+        row = dict(id=item.id, question=item.question)
+        if error is None:
+            row['answer'] = answer
+        else:
+            row['error'] = error
+        yield row
+
+
+def run_batch(items, answer_fn, concurrency=8):
+    """Beantwortet ``items`` mit ``answer_fn(question)`` in einem Thread-Pool.
+
+    Generator über Ergebniszeilen (Fertigstellungsreihenfolge). Wird er
+    vorzeitig geschlossen (z. B. Client-Abbruch), werden offene Aufträge verworfen.
+    """
+    for item in items:
+        if item.error:
+            yield dict(id=item.id, question=item.question, error=item.error)
+    groups = group_questions(items)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch')
+    try:
+        futures = {executor.submit(answer_fn, question): members for question, members in groups.values()}
+        for future in concurrent.futures.as_completed(futures):
+            members = futures[future]
+            try:
+                answer = future.result()
+            except ProviderError as e:
+                yield from _results(members, error=str(e))
+            except Exception as e:
+                logging.exception('Batch-Frage fehlgeschlagen')
+                yield from _results(members, error=f"Technischer Fehler: {e}")
+            else:
+                yield from _results(members, answer=answer)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_native_openai(items, client, model, build_messages, state_path, poll_sec=30.0, max_tokens=500):
+    """Beantwortet ``items`` über die OpenAI Batch API (asynchron, bis zu 24 h).
+
+    Batch-ID und Datei-ID werden in ``state_path`` gespeichert, sodass ein
+    abgebrochener Lauf weiter auf denselben Batch wartet statt neu einzureichen.
+    """
+    from providers import run_sync
+
+    for item in items:
+        if item.error:
+            yield dict(id=item.id, question=item.question, error=item.error)
+    groups = group_questions(items)
+    if not groups:
+        return
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as fh:
+            state = json.load(fh)
+    if not state.get('batch_id'):
+        payload = ''.join(json.dumps({
+            'custom_id': key,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {'model': model, 'messages': build_messages(question), 'max_tokens': max_tokens,
+                     'temperature': 0.7},
+        }, ensure_ascii=False) + '\n' for key, (question, _) in groups.items()).encode('utf-8')
+        upload = run_sync(client.files.create(file=('batch.jsonl', payload), purpose='batch'))
+        batch = run_sync(client.batches.create(input_file_id=upload.id, endpoint='/v1/chat/completions',
+                                               completion_window='24h'))
+        state = dict(batch_id=batch.id, input_file_id=upload.id)
+        with open(state_path, 'w', encoding='utf-8') as fh:
+            json.dump(state, fh)
+        logging.info(f"OpenAI-Batch {batch.id} eingereicht ({len(groups)} Fragen)")
+
+    while True:
+        batch = run_sync(client.batches.retrieve(state['batch_id']))
+        if batch.status in NATIVE_DONE_STATES:
+            break
+        counts = getattr(batch, 'request_counts', None)
+        logging.info(f"OpenAI-Batch {batch.id}: {batch.status} "
+                     f"({getattr(counts, 'completed', '?')}/{getattr(counts, 'total', '?')})")
+        time.sleep(poll_sec)
+
+    answered = set()
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = run_sync(client.files.content(file_id))
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            key = row.get('custom_id')
+            if key not in groups or key in answered:
+                continue
+            answered.add(key)
+            members = groups[key][1]
+            response = row.get('response') or {}
+            if response.get('status_code') == 200:
+                answer = response['body']['choices'][0]['message']['content']
+                yield from _results(members, answer=answer)
+            else:
+                error = (row.get('error') or response.get('body', {}).get('error') or {}).get('message')
+                yield from _results(members, error=error or 'Batch-Anfrage fehlgeschlagen')
+    for key, (_, members) in groups.items():
+        if key not in answered:
+            yield from _results(members, error=f"Keine Antwort im Batch ({batch.status})")
+    os.unlink(state_path)
+
+
+def load_checkpoint(path):
+    """IDs mit Antwort aus einer (evtl. unvollständigen) Ausgabedatei."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # abgeschnittene letzte Zeile
+            if 'answer' in row:
+                done.add(str(row['id']))
+    return done
+
+
+def _open_output(path, resume):
+    if not resume or not os.path.exists(path):
+        return open(path, 'w', encoding='utf-8')
+    # nach einem Absturz kann die letzte Zeile unvollständig sein
+    with open(path, 'rb') as fh:
+        complete = True
+        if fh.seek(0, os.SEEK_END) > 0:
+            fh.seek(-1, os.SEEK_END)
+            complete = fh.read(1) == b'\n'
+    out = open(path, 'a', encoding='utf-8')
+    if not complete:
+        out.write('\n')
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fragen aus einer JSONL-Datei gebündelt beantworten')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='JSONL-Datei verarbeiten')
+    run.add_argument('input', help="JSONL mit 'question' (oder 'prompt'/'body') und optional 'id'")
+    run.add_argument('-o', '--output', required=True, help='Ergebnis-JSONL (zugleich Checkpoint)')
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--no-resume', action='store_true', help='Ausgabedatei überschreiben statt fortsetzen')
+    run.add_argument('--native', action='store_true', help='OpenAI Batch API verwenden (günstiger, bis zu 24 h)')
+    run.add_argument('--poll-sec', type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    import app as application  # erst hier: lädt Konfiguration, Provider und Cache
+
+    with open(args.input, encoding='utf-8') as fh:
+        items = parse_items(fh)
+    done = set() if args.no_resume else load_checkpoint(args.output)
+    todo = [item for item in items if item.id not in done]
+    print(f"{len(items)} Einträge, {len(done)} bereits beantwortet, {len(todo)} offen", file=sys.stderr)
+
+    if args.native:
+        primary = application.get_provider().providers[0]
+        if primary.name != 'openai' or application.OPENAI_BASE_URL:
+            parser.error('--native wird nur mit der OpenAI Cloud als primärem Provider unterstützt')
+        results = run_native_openai(
+            todo, primary.client, primary.model,
+            lambda question: application._build_messages(question, [], None),
+            args.output + '.batch.json', poll_sec=args.poll_sec
+        )
+    else:
+        results = run_batch(todo, application.generate_answer, args.concurrency)
+
+    answered = failed = 0
+    with _open_output(args.output, resume=not args.no_resume) as out:
+        for row in results:
+            out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            out.flush()
+            if 'answer' in row:
+                answered += 1
+            else:
+                failed += 1
+            if (answered + failed) % 50 == 0:
+                print(f"... {answered + failed}/{len(todo)}", file=sys.stderr)
+    print(f"Fertig: {answered} beantwortet, {failed} fehlgeschlagen (erneut ausführen zum Wiederholen)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Startzeit messen: ``import app`` in frischen Interpretern.
+
+Jeder Lauf startet ``python -X importtime -c "import app"`` als eigenen
+Prozess (kalter Start wie in einem neuen Container). Ausgabe: Median der
+Gesamtzeit und die teuersten Top-Level-Imports. Mit ``--max-ms`` endet das
+Skript mit Exit-Code 1, wenn der Median die Grenze überschreitet (für CI).
+
+    python bench/import_time.py --runs 7 --top 10
+    python bench/import_time.py --max-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module='app', env=None):
+    """Ein Lauf: {Top-Level-Paket: kumulierte µs} plus Gesamtzeit unter ``module``."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'Import fehlgeschlagen')
+    total = None
+    packages = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if name == module:
+            total = int(cumulative)
+        elif depth == 1:
+            # direkte Imports von ``module`` (Tiefe 0 sind Imports des Interpreter-Starts)
+            packages[name.split('.')[0]] += int(cumulative)
+    return total, dict(packages)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importzeit der App messen')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, help='Grenze für den Median (Exit-Code 1 bei Überschreitung)')
+    parser.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault('OPENAI_API_KEY', 'import-time')  # Konfiguration ohne .env laden können
+    totals, packages = [], defaultdict(list)
+    for _ in range(args.runs):
+        total, per_package = measure(args.module, env)
+        totals.append(total / 1000.0)
+        for name, micros in per_package.items():
+            packages[name].append(micros / 1000.0)
+
+    median = statistics.median(totals)
+    top = sorted(((name, statistics.median(values)) for name, values in packages.items()),
+                 key=lambda item: item[1], reverse=True)[:args.top]
+    if args.json:
+        print(json.dumps(dict(module=args.module, runs=args.runs, median_ms=round(median, 1),
+                              min_ms=round(min(totals), 1), top={n: round(ms, 1) for n, ms in top}), indent=2))
+    else:
+        print(f"import {args.module}: Median {median:.1f} ms (min {min(totals):.1f} ms, {args.runs} Läufe)")
+        for name, ms in top:
+            print(f"  {ms:8.1f} ms  {name}")
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"REGRESSION: Median {median:.1f} ms > {args.max_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
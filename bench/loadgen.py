@@ -0,0 +1,224 @@
+"""Lastgenerator für die laufende App.
+
+Simuliert ``--users`` gleichzeitige Sitzungen (eigene Cookies), die nach einer
+gewichteten Mischung ``/chat``, ``/chat/stream``, ``/history`` und
+``/api/health`` aufrufen, mit exponentieller Denkzeit dazwischen. Ein Teil der
+Fragen sind die Schnellfragen der Oberfläche (trifft den Antwort-Cache), der
+Rest ist ein Gesprächsverlauf pro Sitzung.
+
+Ergebnis (JSON): RPS, p50/p95/p99 pro Endpoint und – aus der Differenz von
+``/metrics`` vor und nach dem Lauf – die mittlere Dauer pro ``/chat``-Stufe.
+
+    python bench/loadgen.py --url http://127.0.0.1:8000 --users 50 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+QUICK_QUESTIONS = (
+    'Ich habe Knieschmerzen nach dem Laufen. Was kann ich tun?',
+    'Mein Sprunggelenk ist geschwollen nach dem Fußball. Was soll ich machen?',
+    'Ich habe starken Muskelkater nach dem Training. Wie kann ich die Regeneration beschleunigen?',
+    'Ich habe Rückenschmerzen nach dem Krafttraining. Ist das normal?',
+)
+FOLLOW_UPS = (
+    'Wie lange sollte ich pausieren?', 'Soll ich kühlen oder wärmen?', 'Hilft eine Bandage?',
+    'Ab wann sollte ich zum Arzt gehen?', 'Welche Übungen helfen beim Wiedereinstieg?',
+    'Darf ich Schmerzmittel nehmen?', 'Wie erkenne ich einen Bänderriss?',
+)
+DEFAULT_MIX = 'chat=6,chat_stream=2,history=1,health=1'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'chat', 'chat_stream', 'history', 'health'}
+    if unknown:
+        raise ValueError(f"Unbekannte Endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    # nearest rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.first_token = []
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def add(self, endpoint, seconds, status):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+        if status >= 400 or status == 0:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[endpoint] = dict(
+                count=len(values),
+                errors=self.errors[endpoint],
+                rps=round(len(values) / duration, 2),
+                p50_ms=_ms(percentile(values, 0.50)),
+                p95_ms=_ms(percentile(values, 0.95)),
+                p99_ms=_ms(percentile(values, 0.99)),
+                status={str(k): v for k, v in sorted(self.statuses[endpoint].items())},
+            )
+        total = sum(len(v) for v in self.latencies.values())
+        first_token = sorted(self.first_token)
+        return dict(
+            duration_sec=round(duration, 2),
+            requests=total,
+            errors=sum(self.errors.values()),
+            rps=round(total / duration, 2),
+            endpoints=endpoints,
+            first_token_p50_ms=_ms(percentile(first_token, 0.50)),
+            first_token_p95_ms=_ms(percentile(first_token, 0.95)),
+        )
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+async def _chat(client, recorder, question):
+    start = time.perf_counter()
+    try:
+        resp = await client.post('/chat', json={'question': question})
+        status = resp.status_code
+    except httpx.HTTPError:
+        status = 0
+    recorder.add('chat', time.perf_counter() - start, status)
+
+
+async def _chat_stream(client, recorder, question):
+    start = time.perf_counter()
+    status = 0
+    try:
+        async with client.stream('POST', '/chat/stream', json={'question': question}) as resp:
+            status = resp.status_code
+            first = True
+            async for line in resp.aiter_lines():
+                if first and line.startswith('event: token'):
+                    recorder.first_token.append(time.perf_counter() - start)
+                    first = False
+                if line.startswith('event: error'):
+                    status = 599  # Fehler im Stream (z. B. Moderation)
+    except httpx.HTTPError:
+        status = 0
+    recorder.add('chat_stream', time.perf_counter() - start, status)
+
+
+async def _get(client, recorder, endpoint, path):
+    start = time.perf_counter()
+    try:
+        resp = await client.get(path)
+        status = resp.status_code
+    except httpx.HTTPError:
+        status = 0
+    recorder.add(endpoint, time.perf_counter() - start, status)
+
+
+async def _session(url, mix, deadline, think_sec, quick_ratio, recorder, rng, timeout):
+    names, weights = list(mix), list(mix.values())
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        await client.get('/')  # Seite laden wie im Browser; das Session-Cookie setzt der erste /chat
+        turn = 0
+        while time.perf_counter() < deadline:
+            action = rng.choices(names, weights)[0]
+            if action in ('chat', 'chat_stream'):
+                if rng.random() < quick_ratio:
+                    question = rng.choice(QUICK_QUESTIONS)
+                else:
+                    question = f"{rng.choice(FOLLOW_UPS)} (Runde {turn})"
+                turn += 1
+                await (_chat if action == 'chat' else _chat_stream)(client, recorder, question)
+            elif action == 'history':
+                await _get(client, recorder, 'history', '/history')
+            else:
+                await _get(client, recorder, 'health', '/api/health')
+            if think_sec > 0:
+                await asyncio.sleep(rng.expovariate(1.0 / think_sec))
+
+
+def scrape_stages(url):
+    """Returns {stage: (sum_sec, count)} aus /metrics (leer, falls nicht verfügbar)."""
+    from prometheus_client.parser import text_string_to_metric_families
+    try:
+        text = httpx.get(url.rstrip('/') + '/metrics', timeout=10).text
+    except httpx.HTTPError:
+        return {}
+    stages = defaultdict(lambda: [0.0, 0.0])
+    for family in text_string_to_metric_families(text):
+        if family.name != 'chat_stage_seconds':
+            continue
+        for sample in family.samples:
+            if sample.name.endswith('_sum'):
+                stages[sample.labels['stage']][0] += sample.value
+            elif sample.name.endswith('_count'):
+                stages[sample.labels['stage']][1] += sample.value
+    return {stage: tuple(values) for stage, values in stages.items()}
+
+
+def stage_means(before, after):
+    """Mittlere Dauer (ms) pro Stufe während des Laufs."""
+    means = {}
+    for stage, (total, count) in after.items():
+        prev_total, prev_count = before.get(stage, (0.0, 0.0))
+        if count > prev_count:
+            means[stage] = round((total - prev_total) / (count - prev_count) * 1000, 2)
+    return means
+
+
+async def run_load(url, users=20, duration=30.0, mix=DEFAULT_MIX, think_ms=500, quick_ratio=0.3,
+                   seed=1, timeout=60.0):
+    """Führt einen Lastlauf aus und gibt die Zusammenfassung (dict) zurück."""
+    mix = parse_mix(mix) if isinstance(mix, str) else mix
+    recorder = Recorder()
+    before = await asyncio.to_thread(scrape_stages, url)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        _session(url, mix, deadline, think_ms / 1000.0, quick_ratio, recorder, random.Random(seed + i), timeout)
+        for i in range(users)
+    ))
+    elapsed = time.perf_counter() - start
+    after = await asyncio.to_thread(scrape_stages, url)
+    result = recorder.summary(elapsed)
+    result.update(users=users, mix=mix, stages_mean_ms=stage_means(before, after))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lastgenerator für /chat, /history und /api/health')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30.0, help='Sekunden')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Gewichte (Standard: {DEFAULT_MIX})')
+    parser.add_argument('--think-ms', type=float, default=500, help='mittlere Denkzeit zwischen Anfragen')
+    parser.add_argument('--quick-ratio', type=float, default=0.3, help='Anteil Schnellfragen (Cache-Treffer)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    result = asyncio.run(run_load(args.url, args.users, args.duration, args.mix, args.think_ms,
+                                  args.quick_ratio, args.seed))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
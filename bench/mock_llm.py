@@ -0,0 +1,209 @@
+"""OpenAI-kompatibler Stub-Server für Lasttests.
+
+Beantwortet ``/v1/chat/completions`` (mit und ohne Streaming),
+``/v1/moderations`` und ``/v1/models`` ohne echtes Modell. Latenz bis zum
+ersten Token, Token-Rate, Antwortlänge und Fehlerquote sind einstellbar.
+Wie beim Prompt-Caching von OpenAI wird der längste bereits gesehene Präfix
+der Nachrichten als ``prompt_tokens_details.cached_tokens`` gemeldet, aber
+erst ab 1024 Token und dann in Schritten von 128 (ein Token = ein Wort):
+
+    python bench/mock_llm.py --port 8765 --latency-ms 300 --tokens-per-sec 50 --error-rate 0.02
+
+Die App nutzt den Stub über ``OPENAI_BASE_URL=http://127.0.0.1:8765/v1``.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = (
+    "Kühlen Sie die betroffene Stelle und lagern Sie das Bein hoch . Bei starken Schmerzen "
+    "Schwellung oder Instabilität sollten Sie ärztlich abklären lassen ob eine Bandverletzung vorliegt ."
+).split()
+
+CACHE_MIN_TOKENS = 1024  # kürzere Präfixe cacht OpenAI nicht
+CACHE_BLOCK_TOKENS = 128
+
+
+def _prompt_tokens(messages):
+    tokens = []
+    for message in messages:
+        tokens.append(f"<{message.get('role')}>")
+        tokens.extend((message.get('content') or '').split())
+    return tokens
+
+
+class MockConfig:
+    def __init__(self, latency_ms=200, jitter_ms=50, tokens_per_sec=60.0, tokens=80,
+                 error_rate=0.0, error_status=429, seed=None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = dict(requests=0, errors=0, streams=0, moderations=0, cached_prompts=0)
+        self._prefixes = set()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def first_token_delay(self):
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def cached_tokens(self, tokens):
+        """Länge des längsten schon gesehenen Präfixes (0 unter ``CACHE_MIN_TOKENS``)."""
+        digest, hashes = hashlib.sha1(), []
+        for count, token in enumerate(tokens, 1):
+            digest.update(token.encode('utf-8') + b'\0')
+            if count >= CACHE_MIN_TOKENS and (count - CACHE_MIN_TOKENS) % CACHE_BLOCK_TOKENS == 0:
+                hashes.append((count, digest.hexdigest()))
+        cached = 0
+        with self._lock:
+            for count, prefix in hashes:
+                if prefix not in self._prefixes:
+                    break
+                cached = count
+            self._prefixes.update(prefix for _, prefix in hashes)
+            if cached:
+                self.counters['cached_prompts'] += 1
+        return cached
+
+    def should_fail(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-Alive, wie bei echten Providern
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'owned_by': 'bench'}]})
+        elif self.path == '/stats':
+            self._json(200, self.config.counters)
+        else:
+            self._json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.endswith('/moderations'):
+            self.config.count('moderations')
+            inputs = body.get('input')
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            self._json(200, {'id': 'modr-mock', 'model': 'mock', 'results': [
+                {'flagged': False, 'categories': {}, 'category_scores': {}} for _ in inputs
+            ]})
+            return
+        if not self.path.endswith('/chat/completions'):
+            self._json(404, {'error': {'message': 'not found'}})
+            return
+
+        config = self.config
+        config.count('requests')
+        time.sleep(config.first_token_delay())
+        if config.should_fail():
+            config.count('errors')
+            self._json(config.error_status, {'error': {'message': 'injected error', 'type': 'mock'}},
+                       headers={'Retry-After': '1'} if config.error_status == 429 else None)
+            return
+
+        words = [_WORDS[i % len(_WORDS)] for i in range(config.tokens)]
+        messages = body.get('messages', [])
+        tokens = _prompt_tokens(messages)
+        prompt_tokens = len(tokens)
+        cached_tokens = config.cached_tokens(tokens)
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words),
+                 'prompt_tokens_details': {'cached_tokens': cached_tokens}}
+        if body.get('stream'):
+            config.count('streams')
+            self._stream(words, usage if (body.get('stream_options') or {}).get('include_usage') else None)
+        else:
+            time.sleep(config.token_interval * len(words))
+            self._json(200, {
+                'id': 'chatcmpl-mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'mock',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' '.join(words)},
+                             'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+
+    def _stream(self, words, usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(payload):
+            data = b'data: ' + (payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')) + b'\n\n'
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        chunk = {'id': 'chatcmpl-mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'mock'}
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.config.token_interval)
+                send(dict(chunk, choices=[{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]))
+            send(dict(chunk, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+            if usage:
+                send(dict(chunk, choices=[], usage=usage))
+            send(b'[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client hat abgebrochen
+
+
+def serve(host='127.0.0.1', port=8765, **options):
+    """Startet den Stub (blockierend)."""
+    MockHandler.config = MockConfig(**options)
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OpenAI-kompatibler Stub-Server für Lasttests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=200, help='Zeit bis zum ersten Token')
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--tokens-per-sec', type=float, default=60.0)
+    parser.add_argument('--tokens', type=int, default=80, help='Antwortlänge in Token')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Anteil fehlerhafter Antworten (0..1)')
+    parser.add_argument('--error-status', type=int, default=429)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    print(f"Mock-LLM auf http://{args.host}:{args.port}/v1", flush=True)
+    serve(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+          tokens_per_sec=args.tokens_per_sec, tokens=args.tokens, error_rate=args.error_rate,
+          error_status=args.error_status, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Benchmark-Matrix: Gunicorn-Konfigurationen gegen den Mock-LLM vergleichen.
+
+Startet den Stub (``mock_llm.py``), dann für jede Konfiguration ``WxT``
+(Worker x Threads) eine frische App-Instanz mit eigener SQLite-Datenbank und
+führt ``loadgen.py`` aus. Ausgabe: Markdown-Tabelle auf stdout und optional
+JSON (``--out``). Mit ``--baseline`` wird gegen einen früheren JSON-Bericht
+verglichen; Exit-Code 1 bei Regression (für CI).
+
+    python bench/run_matrix.py --configs 1x8,2x16,2x32 --users 40 --duration 20 --out bench.json
+    python bench/run_matrix.py --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from loadgen import DEFAULT_MIX, run_load
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} nicht erreichbar")
+
+
+def _stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def start_mock(port, args):
+    cmd = [sys.executable, os.path.join(BENCH_DIR, 'mock_llm.py'), '--port', str(port),
+           '--latency-ms', str(args.latency_ms), '--tokens-per-sec', str(args.tokens_per_sec),
+           '--tokens', str(args.tokens), '--error-rate', str(args.error_rate), '--seed', '1']
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    _wait_for(f'http://127.0.0.1:{port}/v1/models')
+    return proc
+
+
+def app_env(workdir, mock_port):
+    """Umgebung einer App-Instanz: Mock-LLM, eigene DB, keine Drosselung durch das Rate Limit."""
+    env = dict(os.environ)
+    os.makedirs(os.path.join(workdir, 'metrics'), exist_ok=True)
+    env.update(
+        OPENAI_BASE_URL=f'http://127.0.0.1:{mock_port}/v1',
+        OPENAI_API_KEY='bench',
+        DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+        HISTORY_SPOOL_DIR=os.path.join(workdir, 'spool'),
+        RATE_LIMIT_MAX='1000000',
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+        SECRET_KEY='bench',
+    )
+    return env
+
+
+def run_config(workers, threads, mock_port, args):
+    with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+        env = app_env(workdir, mock_port)
+        subprocess.run([sys.executable, '-c', 'from app import app, init_database\n'
+                        'with app.app_context(): init_database()'],
+                       cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        port = _free_port()
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', str(threads), '-t', '120',
+             '-b', f'127.0.0.1:{port}', 'app:app'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            url = f'http://127.0.0.1:{port}'
+            _wait_for(url + '/api/health')
+            if args.warmup > 0:
+                asyncio.run(run_load(url, users=min(args.users, 5), duration=args.warmup, mix=args.mix,
+                                     think_ms=args.think_ms))
+            result = asyncio.run(run_load(url, users=args.users, duration=args.duration, mix=args.mix,
+                                          think_ms=args.think_ms, quick_ratio=args.quick_ratio))
+        finally:
+            _stop(proc)
+    result['config'] = f'{workers}x{threads}'
+    return result
+
+
+def markdown(results):
+    stages = sorted({stage for r in results for stage in r['stages_mean_ms']})
+    header = ['Config', 'RPS', 'Fehler', 'chat p50', 'chat p95', 'chat p99', 'TTFT p95'] + [f'{s} ms' for s in stages]
+    lines = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+    for r in results:
+        chat = r['endpoints'].get('chat', {})
+        row = [r['config'], r['rps'], r['errors'], chat.get('p50_ms'), chat.get('p95_ms'), chat.get('p99_ms'),
+               r['first_token_p95_ms']] + [r['stages_mean_ms'].get(s) for s in stages]
+        lines.append('| ' + ' | '.join('-' if v is None else str(v) for v in row) + ' |')
+    return '\n'.join(lines)
+
+
+def regressions(results, baseline, max_regression):
+    """Vergleicht RPS und chat-p95 pro Konfiguration mit dem Basisbericht."""
+    previous = {r['config']: r for r in baseline.get('results', [])}
+    problems = []
+    for r in results:
+        base = previous.get(r['config'])
+        if base is None:
+            continue
+        if r['rps'] < base['rps'] * (1 - max_regression):
+            problems.append(f"{r['config']}: RPS {r['rps']} < {base['rps']} (Basis)")
+        p95, base_p95 = r['endpoints'].get('chat', {}).get('p95_ms'), base['endpoints'].get('chat', {}).get('p95_ms')
+        if p95 and base_p95 and p95 > base_p95 * (1 + max_regression):
+            problems.append(f"{r['config']}: chat p95 {p95} ms > {base_p95} ms (Basis)")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gunicorn-Konfigurationen mit Mock-LLM vergleichen')
+    parser.add_argument('--configs', default='1x8,2x16,2x32,4x32', help='Worker x Threads, kommagetrennt')
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--think-ms', type=float, default=200)
+    parser.add_argument('--quick-ratio', type=float, default=0.3)
+    parser.add_argument('--latency-ms', type=float, default=200, help='Mock: Zeit bis zum ersten Token')
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0, help='Mock: Token-Rate')
+    parser.add_argument('--tokens', type=int, default=60, help='Mock: Antwortlänge')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Mock: Anteil 429-Antworten')
+    parser.add_argument('--out', help='JSON-Bericht schreiben')
+    parser.add_argument('--baseline', help='früherer JSON-Bericht zum Vergleich')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+
+    mock_port = _free_port()
+    mock = start_mock(mock_port, args)
+    results = []
+    try:
+        for config in args.configs.split(','):
+            workers, threads = (int(x) for x in config.lower().split('x'))
+            print(f"== {workers} Worker x {threads} Threads ...", file=sys.stderr, flush=True)
+            results.append(run_config(workers, threads, mock_port, args))
+    finally:
+        _stop(mock)
+
+    print(markdown(results))
+    report = dict(created=time.strftime('%Y-%m-%dT%H:%M:%S'), settings=vars(args), results=results)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+    if baseline is not None:
+        problems = regressions(results, baseline, args.max_regression)
+        for problem in problems:
+            print('REGRESSION: ' + problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Token-budgetierter Gesprächskontext.
+
+Aus den neuesten Chat-Einträgen werden so viele Runden übernommen, wie in das
+Token-Budget passen (neueste zuerst). Ältere Runden werden in eine kurze,
+extraktive Zusammenfassung gefaltet, die pro Nutzer gespeichert und nur um neu
+herausgefallene Runden ergänzt wird. So bleibt die Prompt-Größe auch bei
+langen Gesprächen konstant.
+"""
+import math
+import re
+
+CHARS_PER_TOKEN = 3.6  # grobe Schätzung für deutschen Text
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """tiktoken, falls installiert (optional); sonst Zeichen-Heuristik."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            _encoder = None
+        _encoder_loaded = True
+    return _encoder
+
+
+def estimate_tokens(text):
+    """Lokale Token-Schätzung ohne Netzwerkzugriff."""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Kürzt Text auf ca. ``max_tokens`` Tokens (an Wortgrenzen, mit Auslassungszeichen)."""
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+    encoder = _get_encoder()
+    if encoder is not None:
+        cut = encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        cut = text[:int(max_tokens * CHARS_PER_TOKEN)]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip() + ' …'
+
+
+def _turn_tokens(item, answer_max_tokens):
+    # +8 für Rollen-/Formatierungs-Overhead der zwei Nachrichten
+    return estimate_tokens(item.question) + min(estimate_tokens(item.answer), answer_max_tokens) + 8
+
+
+def select_recent_turns(items_newest_first, token_budget, answer_max_tokens):
+    """Wählt die neuesten Runden, die ins Budget passen.
+
+    Returns (kept, aged_out): ``kept`` in chronologischer Reihenfolge,
+    ``aged_out`` die nicht mehr aufgenommenen (älteren) Runden, ebenfalls chronologisch.
+    """
+    kept, used = [], 0
+    for index, item in enumerate(items_newest_first):
+        cost = _turn_tokens(item, answer_max_tokens)
+        if kept and used + cost > token_budget:
+            return kept[::-1], list(items_newest_first[index:])[::-1]
+        kept.append(item)
+        used += cost
+    return kept[::-1], []
+
+
+def format_turns(items, answer_max_tokens):
+    """Runden als Chat-Nachrichten; lange Antworten werden gekürzt wiederholt."""
+    messages = []
+    for item in items:
+        # Reihenfolge: zuerst Nutzerfrage, dann Assistentenantwort
+        if item.question:
+            messages.append({"role": "user", "content": item.question})
+        if item.answer:
+            messages.append({"role": "assistant", "content": truncate_to_tokens(item.answer, answer_max_tokens)})
+    return messages
+
+
+_MARKDOWN = re.compile(r"[*#>`_]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _key_point(answer, max_tokens):
+    """Erste inhaltliche Zeile/den ersten Satz einer Antwort."""
+    for line in (answer or '').splitlines():
+        line = _MARKDOWN.sub('', line).strip(' -:')
+        if len(line) > 15:
+            return truncate_to_tokens(_SENTENCE_END.split(line, 1)[0], max_tokens)
+    return ''
+
+
+def summarize_turns(summary, items, max_tokens, turn_max_tokens=40):
+    """Faltet Runden in die bestehende Zusammenfassung; älteste Zeilen fallen zuerst weg."""
+    lines = [line for line in (summary or '').splitlines() if line.strip()]
+    for item in items:
+        line = f"- Frage: {truncate_to_tokens(item.question.strip(), turn_max_tokens)}"
+        point = _key_point(item.answer, turn_max_tokens)
+        if point:
+            line += f" → {point}"
+        lines.append(line)
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def summary_message(summary):
+    """Zusammenfassung als Systemnachricht (oder leere Liste)."""
+    if not summary:
+        return []
+    return [{"role": "system", "content": "Zusammenfassung des früheren Gesprächsverlaufs:\n" + summary}]
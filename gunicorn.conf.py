@@ -0,0 +1,45 @@
+"""Gunicorn-Konfiguration (wird automatisch aus dem Arbeitsverzeichnis geladen).
+
+Setzt ``PROMETHEUS_MULTIPROC_DIR``, damit ``/metrics`` die Werte aller Worker
+aggregiert. Die Variable muss vor dem Import von ``prometheus_client`` gesetzt
+sein, also bevor die Worker die App laden. Mit ``PROVIDER=local`` lädt jeder
+Worker das lokale Modell direkt nach dem Start (im Hintergrund).
+
+Worker-Modell: gthread mit ``WEB_CONCURRENCY`` Prozessen und ``GUNICORN_THREADS``
+Threads. Jeder laufende Provider-Aufruf belegt einen Thread, mehr als
+``GUNICORN_THREADS`` gleichzeitige Aufrufe gibt es pro Prozess also nicht; die
+tatsächliche Thread-Zahl (auch ``--threads`` auf der Kommandozeile) bekommt
+die App über die Umgebung, um die Provider-Semaphore danach zu bemessen.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'sportverletzung_metrics'))
+
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+timeout = 120
+
+
+def on_starting(server):
+    # Werte eines früheren Laufs verwerfen
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def post_fork(server, worker):
+    # vor dem Laden der App im Worker (ohne --preload); Provider entstehen ohnehin erst beim ersten Request
+    os.environ['GUNICORN_THREADS'] = str(server.cfg.threads)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    import app
+    app.warmup_providers()
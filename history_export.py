@@ -0,0 +1,382 @@
+"""Export, Auswertung und Aufbewahrung des Chat-Verlaufs (``pip install pyarrow``).
+
+- ``export``: liest ``ChatHistory`` in Blöcken über einen Server-seitigen
+  Cursor (``yield_per``; bei PostgreSQL ohne alles in den Speicher zu laden)
+  und schreibt jeden Block sofort als Row Group nach Parquet bzw. als
+  Record Batch nach Arrow (``.arrow``/``.feather``). Fragen und Antworten
+  werden standardmäßig wie die Logs redigiert (E-Mail, Telefon, Keys).
+- ``report``: Kennzahlen über eine Exportdatei oder ein Archivverzeichnis,
+  spaltenweise mit ``pyarrow.compute`` (nur die benötigten Spalten werden
+  gelesen): Verletzungsthemen, Antwortlängen, Anfragen pro Monat, Sprachen.
+- ``retention``: löscht Einträge älter als ``--days`` in kleinen
+  Transaktionen und verdichtet danach die Datenbank (``VACUUM``), damit die
+  Live-Tabelle klein bleibt. Mit ``--archive-dir`` wird zuerst vollständig
+  archiviert (unverändert, ``--redact`` optional); gelöscht wird erst, wenn
+  die Archivdatei abgeschlossen und per fsync auf der Platte ist.
+
+    python history_export.py export verlauf.parquet --since 2024-01-01
+    python history_export.py report verlauf.parquet --top 10
+    python history_export.py retention --days 365 --archive-dir archive/ --compact
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Themen für die Auswertung: Name -> Regex auf der kleingeschriebenen Frage
+TOPICS = {
+    'Knie': r'knie|kreuzband|meniskus|patella',
+    'Sprunggelenk': r'sprunggelenk|knöchel|umgeknickt|umknick|außenband|bänderriss',
+    'Schulter': r'schulter|rotatorenmanschette|ausgekugelt',
+    'Rücken': r'rücken|bandscheibe|lendenwirbel|ischias|nacken',
+    'Muskel': r'zerrung|muskelfaser|muskelriss|muskelkater|oberschenkel|wade',
+    'Achillessehne': r'achilles',
+    'Hüfte/Leiste': r'hüfte|leiste',
+    'Ellenbogen': r'ellenbogen|tennisarm|golferarm',
+    'Hand': r'handgelenk|finger|daumen',
+    'Fuß': r'\bfuß|ferse|plantar|zehe',
+    'Schienbein': r'schienbein|shin ?splint',
+    'Kopf': r'gehirnerschütterung|kopf',
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise SystemExit('pyarrow fehlt: pip install pyarrow') from None
+    return pa
+
+
+def _schema(pa):
+    return pa.schema([
+        ('id', pa.int64()),
+        ('chat_id', pa.string()),
+        ('user_id', pa.int64()),
+        ('language', pa.string()),
+        ('timestamp', pa.timestamp('ms')),
+        ('question', pa.string()),
+        ('answer', pa.string()),
+        ('question_chars', pa.int32()),
+        ('answer_chars', pa.int32()),
+    ])
+
+
+def _format(path):
+    return 'ipc' if path.endswith(('.arrow', '.feather')) else 'parquet'
+
+
+class _Writer:
+    """Inkrementeller Writer; die Datei erscheint erst nach ``close()`` unter ihrem Namen."""
+
+    def __init__(self, path, compression='zstd'):
+        pa = _pyarrow()
+        self.pa = pa
+        self.schema = _schema(pa)
+        self.path = path
+        self._tmp = path + '.part'
+        if _format(path) == 'ipc':
+            self._writer = pa.ipc.new_file(self._tmp, self.schema)
+        else:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._tmp, self.schema, compression=compression)
+        self.rows = 0
+
+    def write(self, rows, redact=None):
+        """``rows``: Tupel (id, chat_id, user_id, language, timestamp, question, answer) wie aus ``_select``."""
+        if not rows:
+            return
+        pa = self.pa
+        import pyarrow.compute as pc
+        columns = list(zip(*rows))
+        questions, answers = columns[5], columns[6]
+        if redact is not None:
+            questions = [redact(text) for text in questions]
+            answers = [redact(text) for text in answers]
+        questions = pa.array(questions, pa.string())
+        answers = pa.array(answers, pa.string())
+        batch = pa.record_batch([
+            pa.array(columns[0], pa.int64()),
+            pa.array(columns[1], pa.string()),
+            pa.array(columns[2], pa.int64()),
+            pa.array(columns[3], pa.string()),
+            pa.array(columns[4], pa.timestamp('ms')),
+            questions,
+            answers,
+            pc.utf8_length(questions).cast(pa.int32()),
+            pc.utf8_length(answers).cast(pa.int32()),
+        ], schema=self.schema)
+        self._writer.write_batch(batch)
+        self.rows += len(rows)
+
+    def close(self):
+        self._writer.close()
+        with open(self._tmp, 'rb') as fh:
+            os.fsync(fh.fileno())
+        os.replace(self._tmp, self.path)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+
+    def abort(self):
+        self._writer.close()
+        os.remove(self._tmp)
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # z. B. Windows: Verzeichnisse lassen sich nicht öffnen
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _select(application, since=None, until=None, max_id=None):
+    db, ChatHistory, User = application.db, application.ChatHistory, application.User
+    query = (
+        db.select(ChatHistory.id, ChatHistory.chat_id, ChatHistory.user_id, User.language,
+                  ChatHistory.timestamp, ChatHistory.question, ChatHistory.answer)
+        .join(User, User.id == ChatHistory.user_id)
+    )
+    if since is not None:
+        query = query.where(ChatHistory.timestamp >= since)
+    if until is not None:
+        query = query.where(ChatHistory.timestamp < until)
+    if max_id is not None:
+        query = query.where(ChatHistory.id <= max_id)
+    return query
+
+
+def export_history(application, path, since=None, until=None, chunk_size=5000, redact=None, progress=None,
+                   max_id=None):
+    """Streamt den Verlauf (nach ``id``) in eine Parquet-/Arrow-Datei. Returns die Zeilenzahl."""
+    writer = _Writer(path)
+    query = _select(application, since, until, max_id).order_by(application.ChatHistory.id)
+    try:
+        result = application.db.session.execute(query.execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            writer.write(rows, redact)
+            if progress is not None:
+                progress(writer.rows)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.rows
+
+
+### --- Auswertung ---
+def _dataset(path):
+    import pyarrow.dataset as ds
+    if os.path.isdir(path):
+        # unvollständige Dateien (``.part``) abgebrochener Läufe ignorieren
+        files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet'))
+        return ds.dataset(files, format='parquet')
+    return ds.dataset(path, format=_format(path))
+
+
+def history_report(path, top=10, batch_size=65536):
+    """Kennzahlen über Export oder Archiv, blockweise und spaltenweise berechnet."""
+    _pyarrow()
+    import numpy as np
+    import pyarrow.compute as pc
+
+    dataset = _dataset(path)
+    columns = ['user_id', 'language', 'timestamp', 'question', 'question_chars', 'answer_chars']
+    rows = 0
+    users = set()
+    months, languages, topics = Counter(), Counter(), Counter()
+    answer_lengths, question_lengths = [], []
+    first = last = None
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        if batch.num_rows == 0:
+            continue
+        rows += batch.num_rows
+        users.update(pc.unique(batch.column('user_id')).to_pylist())
+        for column, counter in ((pc.fill_null(pc.strftime(batch.column('timestamp'), '%Y-%m'), '?'), months),
+                                (pc.fill_null(batch.column('language'), '?'), languages)):
+            counts = pc.value_counts(column)
+            counter.update(dict(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist())))
+        lowered = pc.utf8_lower(batch.column('question'))
+        matched = None
+        for name, pattern in TOPICS.items():
+            mask = pc.match_substring_regex(lowered, pattern)
+            topics[name] += pc.sum(mask).as_py() or 0
+            matched = mask if matched is None else pc.or_(matched, mask)
+        topics['Sonstige'] += batch.num_rows - (pc.sum(matched).as_py() or 0)
+        answer_lengths.append(batch.column('answer_chars').to_numpy(zero_copy_only=False))
+        question_lengths.append(batch.column('question_chars').to_numpy(zero_copy_only=False))
+        bounds = pc.min_max(batch.column('timestamp'))
+        low, high = bounds['min'].as_py(), bounds['max'].as_py()
+        first = low if first is None or (low is not None and low < first) else first
+        last = high if last is None or (high is not None and high > last) else last
+
+    def lengths(parts):
+        if not parts:
+            return {}
+        values = np.concatenate(parts)
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return dict(mean=round(float(values.mean()), 1), p50=int(p50), p90=int(p90), p99=int(p99),
+                    max=int(values.max()))
+
+    return {
+        'rows': rows,
+        'users': len(users),
+        'first': first.isoformat() if first else None,
+        'last': last.isoformat() if last else None,
+        'topics': dict(topics.most_common(top)),
+        'answer_chars': lengths(answer_lengths),
+        'question_chars': lengths(question_lengths),
+        'per_month': dict(sorted(months.items())),
+        'languages': dict(languages.most_common()),
+    }
+
+
+def _print_report(report):
+    print(f"{report['rows']} Einträge von {report['users']} Nutzern ({report['first']} bis {report['last']})")
+    print('\nThemen:')
+    for name, count in report['topics'].items():
+        share = count / report['rows'] * 100 if report['rows'] else 0
+        print(f"  {name:16} {count:8}  {share:5.1f} %")
+    for key, label in (('answer_chars', 'Antwortlänge'), ('question_chars', 'Fragelänge')):
+        stats = report[key]
+        if stats:
+            print(f"\n{label} (Zeichen): Mittel {stats['mean']}, p50 {stats['p50']}, p90 {stats['p90']}, "
+                  f"p99 {stats['p99']}, max {stats['max']}")
+    print('\nPro Monat:')
+    for month, count in report['per_month'].items():
+        print(f"  {month}  {count:8}")
+    print('\nSprachen: ' + ', '.join(f"{lang} {count}" for lang, count in report['languages'].items()))
+
+
+### --- Aufbewahrung ---
+def apply_retention(application, days, archive_dir=None, batch_size=1000, dry_run=False, redact=None,
+                    progress=None):
+    """Löscht Einträge älter als ``days`` in Blöcken (je eine Transaktion), optional vorher archiviert.
+
+    Mit Archiv wird zuerst alles bis zur höchsten betroffenen ``id`` exportiert
+    und die Datei abgeschlossen; erst dann wird genau dieser Bereich gelöscht.
+    Ein Abbruch kann so höchstens doppelt archivierte, nie verlorene Zeilen
+    hinterlassen. Returns dict(cutoff, deleted, archive).
+    """
+    db, ChatHistory = application.db, application.ChatHistory
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    if dry_run:
+        count = db.session.scalar(db.select(db.func.count()).select_from(ChatHistory)
+                                  .where(ChatHistory.timestamp < cutoff))
+        return dict(cutoff=cutoff.isoformat(), deleted=0, would_delete=count, archive=None)
+
+    max_id = db.session.scalar(db.select(db.func.max(ChatHistory.id)).where(ChatHistory.timestamp < cutoff))
+    if max_id is None:
+        return dict(cutoff=cutoff.isoformat(), deleted=0, archive=None)
+
+    archive = None
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+        for name in os.listdir(archive_dir):
+            if name.endswith('.part'):
+                os.remove(os.path.join(archive_dir, name))  # Reste abgebrochener Läufe, nichts davon gelöscht
+        archive = os.path.join(archive_dir, f"chat_history_bis_{cutoff:%Y%m%d}_{int(time.time())}.parquet")
+        export_history(application, archive, until=cutoff, redact=redact, max_id=max_id)
+
+    ids_query = (db.select(ChatHistory.id)
+                 .where(ChatHistory.timestamp < cutoff, ChatHistory.id <= max_id)
+                 .order_by(ChatHistory.id).limit(batch_size))
+    deleted = 0
+    while True:
+        ids = db.session.scalars(ids_query).all()
+        if not ids:
+            break
+        db.session.execute(db.delete(ChatHistory).where(ChatHistory.id.in_(ids)))
+        db.session.commit()
+        deleted += len(ids)
+        if progress is not None:
+            progress(deleted)
+    return dict(cutoff=cutoff.isoformat(), deleted=deleted, archive=archive)
+
+
+def compact_database(application):
+    """Gibt nach dem Löschen Platz frei und aktualisiert die Statistiken des Query-Planers."""
+    engine = application.db.engine
+    application.db.session.remove()
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.exec_driver_sql('VACUUM')
+            conn.exec_driver_sql('ANALYZE')
+    elif engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('VACUUM (ANALYZE) chat_history')
+
+
+def _date(value):
+    return datetime.fromisoformat(value)
+
+
+def _redactor(enabled):
+    if not enabled:
+        return None
+    from log_pipeline import Redactor
+    return Redactor()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Chat-Verlauf exportieren, auswerten und bereinigen')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='Verlauf nach Parquet/Arrow exportieren')
+    export.add_argument('output', help='Zieldatei (.parquet, .arrow oder .feather)')
+    export.add_argument('--since', type=_date, help='ab Zeitpunkt (ISO, UTC)')
+    export.add_argument('--until', type=_date, help='vor Zeitpunkt (ISO, UTC)')
+    export.add_argument('--chunk-size', type=int, default=5000)
+    export.add_argument('--no-redact', action='store_true', help='Fragen/Antworten unverändert exportieren')
+    report = sub.add_parser('report', help='Kennzahlen aus Export oder Archivverzeichnis')
+    report.add_argument('input')
+    report.add_argument('--top', type=int, default=len(TOPICS) + 1)
+    report.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    retention = sub.add_parser('retention', help='alte Einträge löschen (optional archivieren)')
+    retention.add_argument('--days', type=int, default=int(os.getenv('HISTORY_RETENTION_DAYS', '365')))
+    retention.add_argument('--archive-dir', help='gelöschte Einträge vorher als Parquet ablegen')
+    retention.add_argument('--batch-size', type=int, default=1000)
+    retention.add_argument('--dry-run', action='store_true', help='nur zählen')
+    retention.add_argument('--compact', action='store_true', help='danach VACUUM/ANALYZE ausführen')
+    retention.add_argument('--redact', action='store_true', help='Archiv wie die Logs redigieren (verlustbehaftet)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        result = history_report(args.input, top=args.top)
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            _print_report(result)
+        return
+
+    if args.command == 'retention' and args.archive_dir or args.command == 'export':
+        _pyarrow()  # vor dem ersten Löschen prüfen
+    import app as application  # erst hier: lädt Konfiguration und Datenbank
+
+    def progress(count):
+        if count % 50000 < (args.chunk_size if args.command == 'export' else args.batch_size):
+            print(f"... {count}", file=sys.stderr)
+
+    with application.app.app_context():
+        if args.command == 'export':
+            start = time.perf_counter()
+            rows = export_history(application, args.output, args.since, args.until, args.chunk_size,
+                                  _redactor(not args.no_redact), progress)
+            print(f"{rows} Einträge nach {args.output} exportiert ({time.perf_counter() - start:.1f} s)",
+                  file=sys.stderr)
+        else:
+            result = apply_retention(application, args.days, args.archive_dir, args.batch_size, args.dry_run,
+                                     _redactor(args.redact), progress)
+            if args.compact and not args.dry_run:
+                compact_database(application)
+                result['compacted'] = True
+            print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Write-behind für ChatHistory.
+
+``/chat`` legt die neue Zeile nur noch in eine Warteschlange und hängt sie an
+eine lokale Spool-Datei an (JSON Lines); ein Hintergrund-Thread schreibt die
+Warteschlange gebündelt (nach Größe oder Zeit) in die Datenbank.
+
+Spool-Segmente:
+- Jeder Prozess schreibt in sein eigenes, per ``flock`` gesperrtes Segment.
+- Vor jedem Flush wird das Segment versiegelt (ein neues wird begonnen); nach
+  erfolgreichem Commit werden die versiegelten Segmente gelöscht.
+- Segmente, deren Sperre niemand mehr hält, stammen von abgestürzten Prozessen
+  und werden beim Start (``init_app``) und danach regelmäßig nachgespielt.
+  Bereits geschriebene ``chat_id``s werden dabei übersprungen, das
+  Nachspielen ist also idempotent.
+
+Schlägt ein Flush fehl, weil die Datenbank nicht erreichbar ist, wird der
+ganze Block später erneut versucht. Andere Fehler (z. B. Constraint-Verletzung)
+betreffen einzelne Zeilen: der Block wird dann zeilenweise geschrieben, und
+eine Zeile, die ``max_attempts``-mal scheitert, landet in ``dead-letter.jsonl``
+statt alle folgenden Zeilen aufzuhalten.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: keine prozessübergreifende Sperre
+    fcntl = None
+
+from sqlalchemy.exc import OperationalError
+
+import metrics
+
+# Wie ChatHistory, aber noch ohne Primärschlüssel (id=None)
+PendingChat = namedtuple('PendingChat', ['id', 'chat_id', 'user_id', 'question', 'answer', 'timestamp'])
+
+ORPHAN_MIN_AGE_SEC = 300  # nur ohne fcntl: so alt muss ein fremdes Segment sein
+ORPHAN_SCAN_INTERVAL_SEC = 60  # verwaiste Segmente (z. B. abgestürzter Worker) regelmäßig suchen
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+
+
+def _serialize(row):
+    return json.dumps(dict(row, timestamp=row['timestamp'].isoformat()), ensure_ascii=False)
+
+
+def _deserialize(line):
+    row = json.loads(line)
+    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return row
+
+
+class _Segment:
+    def __init__(self, path, handle):
+        self.path = path
+        self.handle = handle
+
+
+class HistoryWriter:
+    """Gebündeltes, asynchrones Schreiben von ChatHistory-Zeilen mit Spool-Datei."""
+
+    def __init__(self, db, model, spool_dir, batch_size=100, flush_interval_sec=0.25, fsync=False, max_attempts=5,
+                 app=None):
+        self.app = None
+        self.db = db
+        self.model = model
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._queue = []
+        self._inflight = []  # gerade im Flush: noch nicht committet, aber für pending_for sichtbar
+        self._attempts = {}  # chat_id -> fehlgeschlagene Einzelversuche
+        self._segment = None
+        self._sealed = []
+        self._seq = 0
+        self._thread = None
+        self._stopping = False
+        self._pid = None
+        self.counters = dict(submitted=0, flushed=0, flushes=0, failed_flushes=0, replayed=0, dead_lettered=0)
+        self.last_flush_ms = 0.0
+        self._fork_hook = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bindet den Writer an die App und startet den Thread (spielt verwaiste Segmente nach)."""
+        self.app = app
+        self._ensure_started()
+        if not self._fork_hook and hasattr(os, 'register_at_fork'):
+            # Gunicorn mit --preload: jeder Worker braucht eigenen Thread und eigenes Segment
+            os.register_at_fork(after_in_child=self._after_fork)
+            self._fork_hook = True
+
+    def _after_fork(self):
+        self._cond = threading.Condition()  # die Sperre kann beim fork gehalten worden sein
+        self._ensure_started()
+
+    # --- Request-Pfad ---
+    def submit(self, row):
+        """Reiht eine Zeile (dict mit chat_id, user_id, question, answer, timestamp) ein."""
+        self._ensure_started()
+        line = _serialize(row) + '\n'
+        with self._cond:
+            if self._segment is None:
+                self._segment = self._open_segment()
+            self._segment.handle.write(line)
+            self._segment.handle.flush()
+            if self.fsync:
+                os.fsync(self._segment.handle.fileno())
+            self._queue.append(row)
+            self.counters['submitted'] += 1
+            metrics.HISTORY_QUEUE_DEPTH.set(len(self._queue))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def pending_for(self, user_id):
+        """Noch nicht geschriebene Zeilen eines Nutzers, neueste zuerst."""
+        with self._cond:
+            rows = [row for row in self._inflight + self._queue if row['user_id'] == user_id]
+        return [PendingChat(None, **row) for row in reversed(rows)]
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._inflight) + len(self._queue)
+            sealed = len(self._sealed)
+        return dict(self.counters, queue_depth=depth, sealed_segments=sealed,
+                    last_flush_ms=round(self.last_flush_ms, 2))
+
+    # --- Spool ---
+    def _open_segment(self):
+        self._seq += 1
+        base = os.path.join(self.spool_dir, f"history-{os.getpid()}-{time.time_ns():x}-{self._seq}")
+        handle = open(base + '.tmp', 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        # erst nach dem Sperren sichtbar machen, damit kein anderer Prozess es als verwaist ansieht
+        os.rename(base + '.tmp', base + '.jsonl')
+        return _Segment(base + '.jsonl', handle)
+
+    def _release(self, segments):
+        for segment in segments:
+            try:
+                os.unlink(segment.path)
+            except FileNotFoundError:
+                pass
+            segment.handle.close()
+
+    def _replay_orphans(self):
+        """Spielt Segmente abgestürzter Prozesse nach."""
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'history-*.jsonl'))):
+            try:
+                handle = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # gehört einem laufenden Prozess
+                elif time.time() - os.path.getmtime(path) < ORPHAN_MIN_AGE_SEC:
+                    continue
+                rows = [_deserialize(line) for line in handle if line.strip()]
+                if rows:
+                    self._write(rows, skip_existing=True)
+                    self.counters['replayed'] += len(rows)
+                    logging.warning(f"History-Spool nachgespielt: {len(rows)} Zeilen aus {os.path.basename(path)}")
+                os.unlink(path)
+            except Exception as e:
+                logging.error(f"History-Spool {path} konnte nicht nachgespielt werden: {e}")
+            finally:
+                handle.close()
+
+    # --- Hintergrund-Thread ---
+    def _ensure_started(self):
+        # nach einem fork (Gunicorn) gehören Thread und Segment dem Elternprozess
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._queue, self._inflight, self._segment, self._sealed = [], [], None, []
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def _write(self, rows, skip_existing=False):
+        with self.app.app_context():
+            if skip_existing:
+                existing = set(self.db.session.scalars(
+                    self.db.select(self.model.chat_id).where(
+                        self.model.chat_id.in_([row['chat_id'] for row in rows]))
+                ))
+                rows = [row for row in rows if row['chat_id'] not in existing]
+            for start in range(0, len(rows), self.batch_size):
+                self.db.session.execute(self.db.insert(self.model), rows[start:start + self.batch_size])
+            self.db.session.commit()
+
+    def _run(self):
+        self._replay_orphans()
+        next_scan = time.monotonic() + ORPHAN_SCAN_INTERVAL_SEC
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping or len(self._queue) >= self.batch_size,
+                                    timeout=self.flush_interval_sec)
+                rows, self._queue = self._queue, []
+                self._inflight = rows
+                if self._segment is not None:
+                    self._sealed.append(self._segment)
+                    self._segment = None
+                sealed = list(self._sealed)
+                stopping = self._stopping
+            if rows:
+                self._flush(rows, sealed)
+            if stopping:
+                return
+            if time.monotonic() >= next_scan:
+                self._replay_orphans()
+                next_scan = time.monotonic() + ORPHAN_SCAN_INTERVAL_SEC
+
+    def _flush(self, rows, sealed):
+        start = time.perf_counter()
+        try:
+            self._write(rows)
+            retry, written = [], len(rows)
+        except OperationalError as e:
+            # Datenbank nicht erreichbar/gesperrt: ganzer Block später noch einmal
+            logging.error(f"History-Flush fehlgeschlagen ({len(rows)} Zeilen), neuer Versuch folgt: {e}")
+            retry = rows
+        except Exception as e:
+            logging.error(f"History-Flush fehlgeschlagen ({len(rows)} Zeilen), schreibe zeilenweise: {e}")
+            retry, written = self._write_rows(rows), 0  # zählt selbst
+        if retry:
+            self.counters['failed_flushes'] += 1
+            with self._cond:
+                self._inflight = []
+                self._queue[:0] = retry
+                metrics.HISTORY_QUEUE_DEPTH.set(len(self._queue))
+            # versiegelte Segmente bleiben liegen, bis alle ihre Zeilen geschrieben sind
+            time.sleep(self.flush_interval_sec)
+            return
+        elapsed = time.perf_counter() - start
+        self.last_flush_ms = elapsed * 1000
+        metrics.HISTORY_FLUSH_SECONDS.observe(elapsed)
+        self.counters['flushed'] += written
+        self.counters['flushes'] += 1
+        with self._cond:
+            self._inflight = []
+            self._sealed = [s for s in self._sealed if s not in sealed]
+            metrics.HISTORY_QUEUE_DEPTH.set(len(self._queue))
+        self._release(sealed)
+
+    def _write_rows(self, rows):
+        """Schreibt jede Zeile einzeln; Returns die Zeilen für einen neuen Versuch."""
+        retry = []
+        for row in rows:
+            try:
+                self._write([row], skip_existing=True)
+            except OperationalError:
+                retry.append(row)
+                continue
+            except Exception as e:
+                attempts = self._attempts.get(row['chat_id'], 0) + 1
+                if attempts < self.max_attempts:
+                    self._attempts[row['chat_id']] = attempts
+                    retry.append(row)
+                else:
+                    self._attempts.pop(row['chat_id'], None)
+                    self._dead_letter(row, e)
+                continue
+            self._attempts.pop(row['chat_id'], None)
+            self.counters['flushed'] += 1
+        return retry
+
+    def _dead_letter(self, row, error):
+        path = os.path.join(self.spool_dir, DEAD_LETTER_FILE)
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(dict(json.loads(_serialize(row)), error=str(error)), ensure_ascii=False) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.counters['dead_lettered'] += 1
+        logging.error(f"History-Zeile {row['chat_id']} nach {self.max_attempts} Versuchen verworfen "
+                      f"(siehe {path}): {error}")
+
+    def close(self, timeout=10.0):
+        """Schreibt die Warteschlange und beendet den Thread (z. B. atexit)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
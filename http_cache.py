@@ -0,0 +1,147 @@
+"""HTTP-Caching und Kompression.
+
+- Kompression: gzip bzw. Brotli (falls das Paket ``brotli`` installiert ist)
+  für textuelle Antworten ab einer Mindestgröße. Gestreamte Antworten (SSE,
+  NDJSON) bleiben unverändert. Die ETag wird dabei schwach (``W/``), bedingte
+  Anfragen liefern also weiter 304.
+- Statische Dateien: Inhalts-Hash als ``?v=`` an jeder ``url_for('static')``-URL;
+  Anfragen mit aktueller Version werden ein Jahr als ``immutable`` gecacht.
+- ``build_id()``: Hash über ``static/`` und ``templates/``, damit sich ETags
+  gerenderter Seiten nach einem Deploy ändern.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request
+
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+))
+
+
+def _brotli():
+    try:
+        import brotli  # optional: pip install brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class HttpCaching:
+    """Kompression + Fingerprinting statischer Dateien für eine Flask-App."""
+
+    def __init__(self, compress=True, min_size=500, gzip_level=6, brotli_quality=5,
+                 static_max_age_sec=31536000, app=None):
+        self.compress = compress
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.static_max_age_sec = static_max_age_sec
+        self._brotli = _brotli() if compress else None
+        self._versions = {}  # Dateiname -> (mtime_ns, Version)
+        self._compressed = {}  # (Dateiname, ETag, Encoding) -> Bytes
+        self._lock = threading.Lock()
+        self._build_id = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.url_defaults(self._static_url_defaults)
+        app.after_request(self._after_request)
+
+    # --- Fingerprinting ---
+    def static_version(self, filename):
+        """Kurzer Inhalts-Hash einer Datei aus ``static/`` (None, falls nicht vorhanden)."""
+        path = os.path.join(self.app.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._versions.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as fh:
+            version = hashlib.sha256(fh.read()).hexdigest()[:12]
+        self._versions[filename] = (mtime, version)
+        return version
+
+    def build_id(self):
+        """Stabil pro Deploy: ändert sich mit jeder Datei in ``static/`` und ``templates/``."""
+        if self._build_id is None:
+            digest = hashlib.sha256()
+            for folder in (self.app.static_folder, os.path.join(self.app.root_path, self.app.template_folder)):
+                for root, _, files in sorted(os.walk(folder)):
+                    for name in sorted(files):
+                        stat = os.stat(os.path.join(root, name))
+                        digest.update(f"{os.path.relpath(root, folder)}/{name}:{stat.st_size}:{stat.st_mtime_ns}\0".encode())
+            self._build_id = digest.hexdigest()[:12]
+        return self._build_id
+
+    def _static_url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = self.static_version(values['filename'])
+            if version:
+                values['v'] = version
+
+    # --- Response-Hook ---
+    def _after_request(self, response):
+        if request.endpoint == 'static' and response.status_code in (200, 304):
+            version = request.args.get('v')
+            if version and version == self.static_version(request.view_args.get('filename', '')):
+                response.cache_control.no_cache = None  # Flask-Standard für send_file
+                response.cache_control.public = True
+                response.cache_control.max_age = self.static_max_age_sec
+                response.cache_control.immutable = True
+        if self.compress:
+            self._compress(response)
+        return response
+
+    def _compress(self, response):
+        static = request.endpoint == 'static'
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES or (response.is_streamed and not static)):
+            return
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(['br', 'gzip'] if self._brotli else ['gzip'])
+        if encoding is None:
+            return
+        static_key = None
+        if static:
+            # send_file liefert einen Datei-Iterator; kleine Dateien einmal komprimieren und merken
+            static_key = (request.view_args.get('filename'), response.get_etag()[0], encoding)
+            cached = self._compressed.get(static_key)
+            if cached is not None:
+                self._set_body(response, cached, encoding)
+                return
+            response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return
+        if encoding == 'br':
+            body = self._brotli.compress(data, quality=self.brotli_quality)
+        else:
+            body = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        if static_key is not None:
+            with self._lock:
+                if len(self._compressed) >= 256:
+                    self._compressed.clear()
+                self._compressed[static_key] = body
+        self._set_body(response, body, encoding)
+
+    @staticmethod
+    def _set_body(response, body, encoding):
+        if response.direct_passthrough:
+            close = getattr(response.response, 'close', None)  # ungelesener Datei-Iterator
+            if close is not None:
+                close()
+            response.direct_passthrough = False
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
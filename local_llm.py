@@ -0,0 +1,176 @@
+"""Lokale CPU-Inferenz mit llama.cpp (``pip install llama-cpp-python``, GGUF-Modelle).
+
+Das Modell läuft im App-Prozess, ohne Netzwerk und ohne Kosten pro Token.
+``slots`` Worker-Threads laden je einen eigenen llama.cpp-Kontext; die
+Gewichte werden per mmap geteilt, liegen also nur einmal im Speicher. Eine
+gemeinsame Warteschlange verteilt die Anfragen: sobald ein Slot frei wird,
+übernimmt er die nächste wartende Anfrage (kontinuierliche Annahme statt
+fester Batches). Jeder Slot behält den KV-Cache seiner letzten Anfrage, der
+gleichbleibende System-Prompt wird also nicht erneut berechnet.
+
+Threads: pro Slot ``threads`` (Standard: verfügbare Kerne / Slots). llama.cpp
+skaliert am besten mit physischen Kernen; bei Hyper-Threading ``LOCAL_THREADS``
+auf die Hälfte der logischen Kerne pro Slot setzen.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+
+def available_cores():
+    """Dem Prozess zugewiesene CPU-Kerne (berücksichtigt Container-cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class _Job:
+    __slots__ = ('messages', 'emit', 'max_tokens', 'temperature', 'cancelled')
+
+    def __init__(self, messages, emit, max_tokens, temperature):
+        self.messages = messages
+        self.emit = emit  # emit(kind, value) mit kind = token | done | error
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class LocalEngine:
+    """Slot-Pool über einem GGUF-Modell mit gemeinsamer Warteschlange."""
+
+    def __init__(self, model_path, slots=2, threads=None, n_ctx=4096, n_batch=512, max_queue=64, chat_format=None):
+        self.model_path = model_path
+        self.slots = max(1, slots)
+        self.threads = threads or max(1, available_cores() // self.slots)
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.chat_format = chat_format
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.error = None
+        self.alive_slots = self.slots  # gestartet und nicht am Laden gescheitert
+        self.ready_slots = 0
+        self.busy_slots = 0
+        self.counters = dict(requests=0, rejected=0, cancelled=0, tokens=0, errors=0)
+        self.warmup_ms = None
+
+    def start(self, warmup_messages=None):
+        """Startet die Slots; Laden und Warm-up laufen im Hintergrund."""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.slots):
+                thread = threading.Thread(target=self._run_slot, args=(warmup_messages,),
+                                          name=f'local-llm-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, messages, emit, max_tokens=400, temperature=0.7):
+        """Reiht eine Anfrage ein. Returns den Job (``cancel()`` bricht ab) oder None, falls voll."""
+        job = _Job(messages, emit, max_tokens, temperature)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.counters['rejected'] += 1
+            return None
+        self.counters['requests'] += 1
+        return job
+
+    def stats(self):
+        return dict(self.counters, slots=self.slots, threads_per_slot=self.threads, alive_slots=self.alive_slots,
+                    ready_slots=self.ready_slots, busy_slots=self.busy_slots, queue_depth=self._queue.qsize(),
+                    warmup_ms=self.warmup_ms, error=self.error)
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+    # --- Slot-Threads ---
+    def _load(self):
+        from llama_cpp import Llama
+        return Llama(
+            model_path=self.model_path,
+            n_ctx=self.n_ctx,
+            n_batch=self.n_batch,
+            n_threads=self.threads,
+            n_threads_batch=self.threads,
+            use_mmap=True,
+            chat_format=self.chat_format,
+            verbose=False
+        )
+
+    def _run_slot(self, warmup_messages):
+        start = time.perf_counter()
+        try:
+            llm = self._load()
+            if warmup_messages:
+                # Seiten des Modells laden und den KV-Cache mit dem System-Prompt füllen
+                self._generate(llm, _Job(warmup_messages, None, 1, 0.0))
+        except Exception as e:
+            logging.error(f"Lokales Modell konnte nicht geladen werden ({threading.current_thread().name}): {e}")
+            with self._lock:
+                self.error = str(e)
+                self.alive_slots -= 1
+                last = self.alive_slots == 0
+            if last:
+                # kein Slot mehr übrig: wartende und neue Anfragen mit Fehler beenden
+                self._drain()
+            return  # sonst übernehmen die übrigen Slots die Warteschlange
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            self.ready_slots += 1
+            self.warmup_ms = max(self.warmup_ms or 0.0, elapsed_ms)
+        logging.info(f"Lokales Modell bereit ({threading.current_thread().name}, {self.threads} Threads, {elapsed_ms} ms)")
+
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.cancelled:
+                self.counters['cancelled'] += 1
+                continue
+            with self._lock:
+                self.busy_slots += 1
+            try:
+                self._generate(llm, job)
+            except Exception as e:
+                self.counters['errors'] += 1
+                logging.exception('Lokale Generierung fehlgeschlagen')
+                job.emit('error', str(e))
+            finally:
+                with self._lock:
+                    self.busy_slots -= 1
+
+    def _generate(self, llm, job):
+        tokens = 0
+        stream = llm.create_chat_completion(messages=job.messages, max_tokens=job.max_tokens,
+                                            temperature=job.temperature, stream=True)
+        try:
+            for chunk in stream:
+                if job.cancelled:
+                    self.counters['cancelled'] += 1
+                    return
+                delta = chunk['choices'][0]['delta'].get('content') if chunk.get('choices') else None
+                if delta:
+                    tokens += 1
+                    if job.emit is not None:
+                        job.emit('token', delta)
+        finally:
+            stream.close()
+            self.counters['tokens'] += tokens
+        if job.emit is not None:
+            job.emit('done', tokens)
+
+    def _drain(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.emit('error', self.error)
@@ -0,0 +1,272 @@
+"""Strukturiertes, asynchrones Logging (JSON-Zeilen) mit Request-IDs.
+
+Request-Threads schreiben nie selbst auf die Platte: ein ``QueueHandler``
+legt die Records in eine Warteschlange, ein ``QueueListener``-Thread
+formatiert und schreibt sie (RotatingFileHandler auf ``server.log``).
+
+- Request-ID: pro Anfrage aus ``X-Request-ID`` übernommen oder neu erzeugt,
+  an jedem Record als ``request_id`` und in der Antwort als Header. Über
+  Contextvars gelangt sie auch in die Provider-Eventloop.
+- Stufen: ``record_stage`` sammelt die Dauer jeder /chat-Stufe; am Ende der
+  Anfrage entsteht eine Zeile mit Status, Gesamtdauer und allen Stufen.
+- Sampling: INFO und darunter werden mit ``sample_rate`` behalten, pro
+  Request-ID deterministisch (eine Anfrage erscheint ganz oder gar nicht).
+  Warnungen und Fehler werden nie verworfen.
+- Redaktion: API-Keys, Tokens, Passwörter, E-Mail-Adressen, Telefonnummern
+  und IP-Adressen werden vor dem Schreiben ersetzt.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, request
+
+request_id_var = ContextVar('request_id', default=None)
+_stages_var = ContextVar('request_stages', default=None)
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attribute jedes LogRecords; alles andere stammt aus ``extra={...}``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+def new_request_id(incoming=None):
+    """Übernimmt eine gültige eingehende ID (z. B. vom Proxy), sonst eine neue."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def begin_request(request_id):
+    """Setzt Request-ID und Stufen-Sammlung für den aktuellen Kontext; Returns Tokens für ``end_request``."""
+    return request_id_var.set(request_id), _stages_var.set({})
+
+
+def end_request(tokens):
+    """Gibt die gesammelten Stufen (Name -> ms) zurück und setzt den Kontext zurück."""
+    stages = _stages_var.get() or {}
+    request_id_var.reset(tokens[0])
+    _stages_var.reset(tokens[1])
+    return stages
+
+
+def record_stage(name, seconds):
+    stages = _stages_var.get()
+    if stages is not None:
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 2)
+
+
+### --- Redaktion ---
+_SECRET_ENV_SUFFIXES = ('_KEY', '_TOKEN', '_SECRET', '_PASSWORD')
+
+_PATTERNS = (
+    (re.compile(r'(?i)\bbearer\s+[A-Za-z0-9._~+/=-]+'), 'Bearer [redacted]'),
+    (re.compile(r'\b(?:sk|pk|rk)-[A-Za-z0-9_-]{16,}'), '[redacted-key]'),
+    (re.compile(r'\bhf_[A-Za-z0-9]{16,}'), '[redacted-key]'),
+    (re.compile(r'(?i)\b(api[_-]?key|token|secret|password|passwd)(["\']?\s*[:=]\s*["\']?)[^\s"\',;]+'),
+     r'\1\2[redacted]'),
+    (re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'), '[email]'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}\b'), '[ip]'),
+    (re.compile(r'(?<![\w.])(?:\+|00)\d{1,3}[\s/-]?\d{2,5}(?:[\s/-]?\d{2,}){1,3}\b'), '[phone]'),
+    (re.compile(r'(?<![\w.])0\d{2,5}[\s/-]\d{3,}(?:[\s-]?\d{2,})*\b'), '[phone]'),
+)
+
+
+class Redactor:
+    """Ersetzt Geheimnisse und personenbezogene Daten in Log-Texten."""
+
+    def __init__(self, secrets=()):
+        # konkrete Werte (z. B. aus .env) zuerst, längste zuerst
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 8}, key=len, reverse=True)
+
+    @classmethod
+    def from_env(cls, environ=None):
+        environ = os.environ if environ is None else environ
+        return cls(value for name, value in environ.items() if name.upper().endswith(_SECRET_ENV_SUFFIXES))
+
+    def __call__(self, text):
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, '[redacted]')
+        for pattern, replacement in _PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+class RedactingFilter(logging.Filter):
+    """Läuft im Listener-Thread, kostet den Request-Thread also nichts."""
+
+    def __init__(self, redactor):
+        super().__init__()
+        self.redactor = redactor
+
+    def filter(self, record):
+        record.msg = self.redactor(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = self.redactor(record.exc_text)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and isinstance(value, str):
+                setattr(record, key, self.redactor(value))
+        return True
+
+
+### --- Request-ID und Sampling (im aufrufenden Thread) ---
+class RequestContextFilter(logging.Filter):
+    """Hängt die Request-ID an und verwirft gesampelte INFO/DEBUG-Records."""
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        if self.sample_rate >= 1.0 or record.levelno > logging.INFO or getattr(record, 'sample', True) is False:
+            return True
+        if record.request_id:
+            return (zlib.crc32(record.request_id.encode()) % 10000) < self.sample_rate * 10000
+        return random.random() < self.sample_rate
+
+
+class _QueueHandler(QueueHandler):
+    """Wie ``QueueHandler``, behält aber den Traceback getrennt von der Nachricht
+    und blockiert nie: ist die Warteschlange voll (Platte hängt), wird verworfen."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args, record.message = message, None, message
+        record.exc_info, record.exc_text = None, exc_text
+        return record
+
+
+### --- Formatierung ---
+class JsonFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Record; Felder aus ``extra={...}`` kommen mit."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'sample':
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+### --- Pipeline ---
+class LogPipeline:
+    """QueueHandler am Root-Logger, QueueListener schreibt in die Datei."""
+
+    def __init__(self, log_file, level=logging.INFO, fmt='json', sample_rate=1.0, redact=True,
+                 max_bytes=10_000_000, backup_count=5, max_queue=10000):
+        self.queue = queue.Queue(maxsize=max_queue)
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+        if redact:
+            file_handler.addFilter(RedactingFilter(Redactor.from_env()))
+        self.handler = _QueueHandler(self.queue)
+        self.handler.addFilter(RequestContextFilter(sample_rate))
+        self.listener = QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.level = level
+
+    def start(self):
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        root.addHandler(self.handler)
+        self.listener.start()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # der Listener-Thread überlebt fork() nicht (z. B. gunicorn --preload)
+            os.register_at_fork(after_in_child=self._restart_in_child)
+        return self
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def _restart_in_child(self):
+        self.listener._thread = None
+        self.listener.start()
+
+    def stats(self):
+        return dict(queue_depth=self.queue.qsize(), dropped=self.handler.dropped)
+
+
+class RequestLog:
+    """Request-ID pro Anfrage (Header ``X-Request-ID``) und eine Abschlusszeile mit allen Stufen."""
+
+    header = 'X-Request-ID'
+
+    def __init__(self, app=None):
+        self.logger = logging.getLogger('request')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g.request_id = new_request_id(request.headers.get(self.header))
+        g.request_log = (time.perf_counter(), begin_request(g.request_id))
+
+    def _after_request(self, response):
+        if 'request_id' in g:
+            response.headers[self.header] = g.request_id
+            g.request_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        # bei Streams (stream_with_context) erst nach dem letzten Stück
+        started, tokens = g.pop('request_log', (None, None))
+        if started is None:
+            return
+        stages = end_request(tokens)
+        status = 500 if exc is not None else g.get('request_status')
+        extra = dict(method=request.method, path=request.path, status=status,
+                     duration_ms=round((time.perf_counter() - started) * 1000, 2), request_id=g.request_id)
+        if stages:
+            extra['stages'] = stages
+        self.logger.info(f"{request.method} {request.path} {status}", extra=extra)
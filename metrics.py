@@ -0,0 +1,133 @@
+"""Prometheus-Metriken für /chat und die Provider.
+
+Unter Gunicorn mit mehreren Workern muss ``PROMETHEUS_MULTIPROC_DIR`` gesetzt
+sein (siehe ``gunicorn.conf.py``); jeder Worker schreibt dann in memory-gemappte
+Dateien und ``/metrics`` aggregiert über alle Worker. Ohne die Variable wird
+die normale Prozess-Registry verwendet (z. B. ``python run.py``).
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from log_pipeline import record_stage
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+STAGES = ('user_lookup', 'rate_limit', 'moderation', 'history_load', 'provider_call', 'db_commit')
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+CHAT_STAGE_SECONDS = Histogram(
+    'chat_stage_seconds', 'Dauer der einzelnen Stufen von /chat', ['stage'], buckets=_LATENCY_BUCKETS
+)
+CHAT_REQUEST_SECONDS = Histogram(
+    'chat_request_seconds', 'Gesamtdauer von /chat bzw. /chat/stream', ['endpoint'], buckets=_LATENCY_BUCKETS
+)
+CHAT_FIRST_TOKEN_SECONDS = Histogram(
+    'chat_first_token_seconds', 'Zeit bis zum ersten Token bei /chat/stream', buckets=_LATENCY_BUCKETS
+)
+CHAT_IN_FLIGHT = Gauge(
+    'chat_in_flight_requests', 'Laufende /chat-Anfragen', multiprocess_mode='livesum'
+)
+PROVIDER_REQUESTS = Counter(
+    'provider_requests_total', 'Aufrufe an KI-Provider', ['provider']
+)
+PROVIDER_ERRORS = Counter(
+    'provider_errors_total', 'Fehler der KI-Provider nach HTTP-Status (429 = Rate-Limit)', ['provider', 'status']
+)
+PROVIDER_FAILOVERS = Counter(
+    'provider_failovers_total', 'Wechsel auf den nächsten Provider nach Fehler', ['provider']
+)
+PROVIDER_HEDGES = Counter(
+    'provider_hedges_total', 'Zusätzlich gestartete (gehedgte) Anfragen', ['provider']
+)
+CIRCUIT_OPENED = Counter(
+    'provider_circuit_opened_total', 'Geöffnete Circuit Breaker', ['provider']
+)
+COALESCED = Counter(
+    'coalesced_requests_total', 'Anfragen, die einen laufenden identischen Aufruf mitnutzen', ['scope']
+)
+LLM_TOKENS = Counter(
+    'llm_tokens_total', 'Token-Verbrauch laut Provider', ['provider', 'kind']
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache-Zugriffe (Trefferquote = hit / alle)', ['cache', 'result']
+)
+HISTORY_QUEUE_DEPTH = Gauge(
+    'history_writer_queue_depth', 'Noch nicht geschriebene ChatHistory-Zeilen', multiprocess_mode='livesum'
+)
+HISTORY_FLUSH_SECONDS = Histogram(
+    'history_writer_flush_seconds', 'Dauer eines gebündelten ChatHistory-Inserts', buckets=_LATENCY_BUCKETS
+)
+
+# Label-Kinder vorab auflösen: spart das Label-Lookup im Hot Path
+_stage_children = {name: CHAT_STAGE_SECONDS.labels(name) for name in STAGES}
+
+
+@contextmanager
+def stage(name):
+    """Misst die Dauer einer /chat-Stufe."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stage_children[name].observe(elapsed)
+        record_stage(name, elapsed)
+
+
+def observe_stage(name, seconds):
+    _stage_children[name].observe(seconds)
+    record_stage(name, seconds)
+
+
+def record_provider_call(provider):
+    PROVIDER_REQUESTS.labels(provider).inc()
+
+
+def record_provider_error(provider, status_code):
+    PROVIDER_ERRORS.labels(provider, str(status_code or 'error')).inc()
+
+
+def record_failover(provider):
+    PROVIDER_FAILOVERS.labels(provider).inc()
+
+
+def record_hedge(provider):
+    PROVIDER_HEDGES.labels(provider).inc()
+
+
+def record_circuit_open(provider):
+    CIRCUIT_OPENED.labels(provider).inc()
+
+
+def record_coalesced(scope):
+    COALESCED.labels(scope).inc()
+
+
+def record_tokens(provider, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+    if prompt_tokens:
+        LLM_TOKENS.labels(provider, 'prompt').inc(prompt_tokens)
+    if cached_tokens:
+        # Teilmenge von 'prompt', vom Provider aus dem Prompt-Cache bedient
+        LLM_TOKENS.labels(provider, 'cached').inc(cached_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(provider, 'completion').inc(completion_tokens)
+
+
+def record_cache(cache, result):
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def render():
+    """Returns (payload, content_type) für den /metrics-Endpoint."""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,26 @@
+"""index chat_history (user_id, timestamp, id) for the history hot path
+
+Revision ID: 0002_chat_history_user_ts_index
+Revises: 0001_initial
+Create Date: 2026-10-18 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_chat_history_user_ts_index'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_history_user_id_timestamp', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_history_user_id_timestamp')
@@ -0,0 +1,26 @@
+"""unique index on chat_history.chat_id (idempotent write-behind replay)
+
+Revision ID: 0003_chat_history_chat_id_unique
+Revises: 0002_chat_history_user_ts_index
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_chat_history_chat_id_unique'
+down_revision = '0002_chat_history_user_ts_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_chat_history_chat_id'), ['chat_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_chat_history_chat_id'))
@@ -0,0 +1,35 @@
+"""conversation_summary table (rolling summary of older turns)
+
+Revision ID: 0004_conversation_summary
+Revises: 0003_chat_history_chat_id_unique
+Create Date: 2026-10-18 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_conversation_summary'
+down_revision = '0003_chat_history_chat_id_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Datenbanken, die mit einer früheren Fassung von 0001_initial migriert
+    # wurden, haben die Tabelle bereits
+    if 'conversation_summary' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('conversation_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=False),
+    sa.Column('last_chat_pk', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('conversation_summary')
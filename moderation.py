@@ -0,0 +1,198 @@
+"""Nicht-blockierende Moderations-Pipeline.
+
+1. Lokaler Schnellpfad: eine kompilierte Blocklist-Regex (alle Begriffe in einer
+   Alternation) lehnt eindeutige Fälle ohne Netzwerkaufruf ab.
+2. Verdict-Cache: wiederholte Eingaben werden nicht erneut geprüft.
+3. Micro-Batching: offene Eingaben werden auf der Provider-Eventloop gesammelt
+   (max. ``max_batch`` Eingaben oder ``max_wait_ms``) und in *einem*
+   Moderations-Aufruf geprüft.
+
+``ModerationPipeline.check(text)`` liefert sofort ein ``concurrent.futures.Future``
+mit ``(is_blocked, reason)``; die Generierung kann parallel dazu laufen.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import metrics
+from providers import event_loop
+
+DEFAULT_BLOCKLIST = (
+    # Selbstgefährdung
+    'mich umbringen', 'mich töten', 'selbstmord begehen', 'suizid begehen', 'kill myself',
+    # Waffen/Gewalt (nur eindeutige Absicht; „beim Sparring jemanden verletzen“ u. ä.
+    # sind normale Fragen und gehen an das Moderationsmodell)
+    'bombe bauen', 'sprengstoff herstellen', 'make a bomb', 'build a bomb',
+    'ich will jemanden umbringen', 'ich will jemanden töten', 'ich will jemanden verletzen',
+    'i want to kill someone',
+)
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return re.sub(r"\s+", ' ', text).strip()
+
+
+def load_blocklist(path=None):
+    """Standard-Blocklist plus optionale Datei (ein Begriff pro Zeile, ``#`` = Kommentar)."""
+    terms = list(DEFAULT_BLOCKLIST)
+    if path:
+        with open(path, encoding='utf-8') as fh:
+            terms.extend(line.strip() for line in fh if line.strip() and not line.startswith('#'))
+    return terms
+
+
+class BlocklistClassifier:
+    """Erkennt Blocklist-Begriffe mit einer einzigen kompilierten Regex."""
+
+    def __init__(self, terms):
+        terms = sorted({_normalize(t) for t in terms if t.strip()}, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(t).replace(r"\ ", r"\s+") for t in terms) + r")(?!\w)"
+        ) if terms else None
+
+    def match(self, text):
+        if self._pattern is None:
+            return None
+        found = self._pattern.search(_normalize(text))
+        return found.group(0) if found else None
+
+
+class VerdictCache:
+    """Thread-sicherer LRU/TTL-Cache für Moderationsergebnisse."""
+
+    def __init__(self, max_entries=4096, ttl_sec=3600):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(_normalize(text).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            verdict, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return verdict
+
+    def put(self, key, verdict):
+        with self._lock:
+            self._entries[key] = (verdict, time.monotonic() + self.ttl_sec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ModerationBatcher:
+    """Sammelt Eingaben auf der Eventloop und prüft sie gebündelt per Moderations-API."""
+
+    def __init__(self, client_factory, model='omni-moderation-latest', max_batch=32, max_wait_ms=20):
+        self._client_factory = client_factory
+        self._client = None  # erst beim ersten Batch erzeugt, nur auf der Loop verwendet
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []  # (text, asyncio.Future), nur auf der Loop verwendet
+        self._flush_handle = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def submit(self, text):
+        """Returns a concurrent.futures.Future with the ``flagged`` bool."""
+        return event_loop.submit(self._enqueue(text))
+
+    async def _enqueue(self, text):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        # identische Texte nur einmal an die API schicken
+        inputs = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            response = await self.client.moderations.create(model=self.model, input=inputs)
+            flagged = {text: bool(getattr(result, 'flagged', False))
+                       for text, result in zip(inputs, response.results)}
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(flagged.get(text, False))
+
+
+class ModerationPipeline:
+    """Blocklist -> Verdict-Cache -> gebündelte Moderations-API."""
+
+    BLOCKED_REASON = 'Content flagged by moderation.'
+
+    def __init__(self, classifier, cache, batcher=None):
+        self.classifier = classifier
+        self.cache = cache
+        self.batcher = batcher
+
+    @staticmethod
+    def _done(verdict):
+        future = concurrent.futures.Future()
+        future.set_result(verdict)
+        return future
+
+    def check(self, text):
+        """Startet die Prüfung und gibt ein Future mit (is_blocked, reason) zurück."""
+        term = self.classifier.match(text)
+        if term:
+            metrics.record_cache('moderation', 'blocklist')
+            return self._done((True, f'Blocklist: {term}'))
+        key = self.cache.key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.record_cache('moderation', 'hit')
+            return self._done(cached)
+        metrics.record_cache('moderation', 'miss')
+        if self.batcher is None:
+            return self._done((False, ''))
+
+        result = concurrent.futures.Future()
+
+        def _on_done(api_future):
+            try:
+                verdict = (True, self.BLOCKED_REASON) if api_future.result() else (False, '')
+                self.cache.put(key, verdict)
+            except Exception:
+                # do not block on moderation errors
+                verdict = (False, '')
+            result.set_result(verdict)
+
+        self.batcher.submit(text).add_done_callback(_on_done)
+        return result
@@ -0,0 +1,529 @@
+"""Asynchrone Provider-Schicht für die KI-Anbieter (OpenAI-kompatibel, Hugging Face, Cohere, lokal).
+
+Alle Provider teilen sich eine asyncio-Eventloop in einem Hintergrund-Thread pro
+Prozess. Dadurch nutzen sie dauerhafte Keep-Alive-Connection-Pools (httpx) und
+ein Semaphor pro Provider begrenzt die gleichzeitigen Upstream-Aufrufe. Die
+Flask-Views (WSGI) warten nur noch auf das Ergebnis, statt selbst HTTP zu sprechen;
+dabei bleibt ihr Thread belegt, pro Prozess laufen also höchstens so viele
+Aufrufe gleichzeitig, wie Gunicorn Threads hat.
+"""
+import asyncio
+import atexit
+import importlib.util
+import json
+import logging
+import os
+import threading
+
+import httpx
+
+import metrics
+
+
+class ProviderError(Exception):
+    """Fehler eines Providers. ``str(err)`` ist die nutzerfreundliche Meldung."""
+
+    def __init__(self, provider, message, status_code=None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+
+
+def format_history_as_prompt(system_prompt, history_messages, new_user_question):
+    """Baut einen zusammenhängenden Prompt für nicht-Chat-APIs (HF/Cohere)."""
+    lines = [system_prompt.strip(), "", "Verlauf:"]
+    for m in history_messages:
+        role = m.get("role", "user")
+        content = (m.get("content") or "").strip()
+        if not content:
+            continue
+        prefix = "Nutzer" if role == "user" else "Assistent"
+        lines.append(f"{prefix}: {content}")
+    lines.append("")
+    lines.append(f"Nutzerfrage: {new_user_question.strip()}")
+    lines.append("Antwort:")
+    return "\n".join(lines)
+
+
+def messages_to_prompt(messages):
+    """Zerlegt Chat-Nachrichten (System + Verlauf + Frage) in einen Text-Prompt."""
+    system_prompt = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    dialog = [m for m in messages if m["role"] != "system"]
+    question = dialog[-1]["content"] if dialog else ""
+    return format_history_as_prompt(system_prompt, dialog[:-1], question)
+
+
+### --- Gemeinsame Eventloop ---
+class _LoopThread:
+    """Startet bei Bedarf eine Eventloop in einem Daemon-Thread (fork-sicher, da lazy)."""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name='provider-loop', daemon=True)
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Plant eine Coroutine ein und gibt ein concurrent.futures.Future zurück."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """Synchroner Iterator über einen asynchronen Generator.
+
+        Wird der Iterator vorzeitig geschlossen, wird ``agen.aclose()`` auf der
+        Loop ausgeführt, sodass der Upstream-Request abgebrochen wird.
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+event_loop = _LoopThread()
+
+
+def run_sync(coro, timeout=None):
+    """Führt eine Provider-Coroutine aus einem (WSGI-)Thread heraus aus."""
+    return event_loop.run(coro, timeout)
+
+
+def iterate_sync(agen):
+    """Konsumiert einen Provider-Stream aus einem (WSGI-)Thread heraus."""
+    return event_loop.iterate(agen)
+
+
+### --- Provider ---
+class BaseProvider:
+    """Gemeinsame Basis: Semaphor für Nebenläufigkeit + gepoolter HTTP-Client."""
+
+    name = 'base'
+
+    def __init__(self, model, max_concurrency=64, max_connections=100, timeout=60.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30.0
+        )
+        self._timeout = timeout
+        self.tokens = dict(prompt=0, cached=0, completion=0)
+
+    @property
+    def in_flight(self):
+        """Anzahl aktuell belegter Semaphor-Plätze."""
+        return self.max_concurrency - self._semaphore._value
+
+    async def complete(self, messages):
+        """Liefert die komplette Antwort als String."""
+        metrics.record_provider_call(self.name)
+        async with self._semaphore:
+            try:
+                return await self._complete(messages)
+            except ProviderError as e:
+                metrics.record_provider_error(self.name, e.status_code)
+                raise
+
+    async def stream(self, messages):
+        """Liefert die Antwort als asynchrone Folge von Text-Deltas."""
+        metrics.record_provider_call(self.name)
+        async with self._semaphore:
+            try:
+                async for delta in self._stream(messages):
+                    yield delta
+            except ProviderError as e:
+                metrics.record_provider_error(self.name, e.status_code)
+                raise
+
+    def _usage(self, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+        """Token-Verbrauch laut Provider-Antwort erfassen (``cached_tokens``: aus dem Prompt-Cache)."""
+        metrics.record_tokens(self.name, prompt_tokens, completion_tokens, cached_tokens)
+        self.tokens['prompt'] += prompt_tokens or 0
+        self.tokens['cached'] += cached_tokens or 0
+        self.tokens['completion'] += completion_tokens or 0
+        if prompt_tokens:
+            logging.info(f"Token ({self.name}): prompt={prompt_tokens} (cached={cached_tokens or 0}), "
+                         f"completion={completion_tokens or 0}")
+
+    async def _complete(self, messages):
+        raise NotImplementedError
+
+    async def _stream(self, messages):
+        # Standard: kein echtes Streaming, komplette Antwort als ein Stück
+        yield await self._complete(messages)
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIProvider(BaseProvider):
+    """OpenAI Cloud oder OpenAI-kompatibler Endpoint (z. B. Ollama)."""
+
+    name = 'openai'
+
+    def __init__(self, api_key, model, base_url=None, **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # schweres SDK (~0,3 s Import), erst beim ersten Aufruf statt beim Start
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self._timeout,
+                        http_client=openai.DefaultAsyncHttpxClient(limits=self._limits)
+                    )
+        return self._client
+
+    def _error(self, e):
+        import openai
+        if isinstance(e, openai.APIStatusError):
+            code = getattr(e, 'status_code', None)
+            if code == 401:
+                return ProviderError(self.name, (
+                    "Leider konnte Ihre Anfrage nicht verarbeitet werden (Auth-Fehler).\n"
+                    "Bitte prüfen Sie den API-Key in der .env-Datei."
+                ), code)
+            if code == 429:
+                return ProviderError(self.name, (
+                    "Aktuell ist das API-Kontingent erschöpft (429).\n"
+                    "Bitte Billing prüfen oder später erneut versuchen."
+                ), code)
+            return ProviderError(self.name, "Ein unerwarteter API-Fehler ist aufgetreten. Bitte später erneut versuchen.", code)
+        return ProviderError(self.name, f"Es ist ein technischer Fehler aufgetreten: {str(e)}")
+
+    def _record_usage(self, usage):
+        # automatisches Prompt-Caching: gleicher Präfix ab 1024 Token
+        details = getattr(usage, 'prompt_tokens_details', None)
+        self._usage(usage.prompt_tokens, usage.completion_tokens, getattr(details, 'cached_tokens', None))
+
+    async def _complete(self, messages):
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7
+            )
+        except Exception as e:
+            raise self._error(e) from e
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self._record_usage(usage)
+        return response.choices[0].message.content
+
+    async def _stream(self, messages):
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7,
+                stream=True,
+                # letzter Chunk enthält den Token-Verbrauch
+                stream_options={"include_usage": True}
+            )
+        except Exception as e:
+            raise self._error(e) from e
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, 'usage', None) is not None:
+                    self._record_usage(chunk.usage)
+        except Exception as e:
+            raise self._error(e) from e
+        finally:
+            await stream.close()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+class HuggingFaceProvider(BaseProvider):
+    """Hugging Face Inference API (Textgenerierung mit Text-Prompt)."""
+
+    name = 'huggingface'
+    base_url = 'https://api-inference.huggingface.co'
+
+    def __init__(self, api_key, model, **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=self._limits,
+            timeout=self._timeout
+        )
+
+    def _payload(self, messages, stream=False):
+        if not self.api_key:
+            raise ProviderError(self.name, "Hugging Face API-Key fehlt. Bitte setzen Sie 'HUGGINGFACE_API_KEY' in der .env-Datei.")
+        payload = {
+            "inputs": messages_to_prompt(messages),
+            "parameters": {
+                "max_new_tokens": 400,
+                "temperature": 0.7,
+                "return_full_text": False
+            }
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _check_status(self, resp):
+        if resp.status_code == 401:
+            raise ProviderError(self.name, "Hugging Face Authentifizierungsfehler (401). Bitte API-Key prüfen.", 401)
+        if resp.status_code == 429:
+            raise ProviderError(self.name, "Hugging Face Rate-Limit erreicht (429). Bitte später erneut versuchen.", 429)
+        if not resp.is_success:
+            raise ProviderError(self.name, f"Hugging Face Fehler: {resp.status_code}. Bitte später erneut versuchen.", resp.status_code)
+
+    def _parse(self, data):
+        # Mögliche Antwortformate: [{"generated_text": "..."}] oder {"error": "..."}
+        if isinstance(data, dict) and data.get("error"):
+            raise ProviderError(self.name, "Hugging Face Antwortfehler: " + str(data.get("error")))
+        if isinstance(data, list) and data and isinstance(data[0], dict):
+            text = data[0].get("generated_text") or data[0].get("summary_text")
+            if text:
+                return text.strip()
+        raise ProviderError(self.name, "Die Antwort des Modells konnte nicht interpretiert werden.")
+
+    def _technical_error(self, e):
+        return ProviderError(self.name, "Es ist ein technischer Fehler (Hugging Face) aufgetreten. Bitte später erneut versuchen.")
+
+    async def _complete(self, messages):
+        payload = self._payload(messages)
+        try:
+            resp = await self.client.post(f"/models/{self.model}", json=payload)
+        except httpx.HTTPError as e:
+            raise self._technical_error(e) from e
+        self._check_status(resp)
+        return self._parse(resp.json())
+
+    async def _stream(self, messages):
+        payload = self._payload(messages, stream=True)
+        try:
+            async with self.client.stream('POST', f"/models/{self.model}", json=payload) as resp:
+                self._check_status(resp)
+                if 'text/event-stream' not in resp.headers.get('Content-Type', ''):
+                    # Modell ohne Streaming-Unterstützung: komplette Antwort als ein Stück
+                    await resp.aread()
+                    yield self._parse(resp.json())
+                    return
+                async for line in resp.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    event = json.loads(line[len('data:'):])
+                    token = event.get('token') or {}
+                    if token.get('text') and not token.get('special'):
+                        yield token['text']
+                    details = event.get('details')
+                    if details:
+                        # TGI liefert im letzten Event die Anzahl generierter Token
+                        self._usage(completion_tokens=details.get('generated_tokens'))
+        except httpx.HTTPError as e:
+            raise self._technical_error(e) from e
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class CohereProvider(BaseProvider):
+    """Cohere Chat-API (Prompt mit Verlauf als eine Nachricht)."""
+
+    name = 'cohere'
+
+    def __init__(self, api_key, model, **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key
+        self._http = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import cohere  # optionaler Import, nur falls konfiguriert
+            self._client = cohere.AsyncClient(api_key=self.api_key, httpx_client=self._http)
+        return self._client
+
+    def _prompt(self, messages):
+        if not self.api_key:
+            raise ProviderError(self.name, "Cohere API-Key fehlt. Bitte setzen Sie 'COHERE_API_KEY' in der .env-Datei.")
+        return messages_to_prompt(messages)
+
+    def _technical_error(self, e):
+        return ProviderError(self.name, "Es ist ein technischer Fehler (Cohere) aufgetreten. Bitte später erneut versuchen.",
+                             getattr(e, 'status_code', None))
+
+    def _record_meta(self, meta):
+        units = getattr(meta, 'billed_units', None)
+        if units is not None:
+            self._usage(getattr(units, 'input_tokens', None), getattr(units, 'output_tokens', None))
+
+    async def _complete(self, messages):
+        prompt = self._prompt(messages)
+        try:
+            try:
+                chat_resp = await self.client.chat(model=self.model, message=prompt, temperature=0.7)
+                # SDK-Formate variieren leicht nach Version
+                text = getattr(chat_resp, 'text', None) or getattr(chat_resp, 'output_text', None)
+                self._record_meta(getattr(chat_resp, 'meta', None))
+                if isinstance(text, str) and text.strip():
+                    return text.strip()
+            except Exception:
+                # Fallback auf generieren
+                gen = await self.client.generate(prompt=prompt, model=self.model, max_tokens=500, temperature=0.7)
+                generations = getattr(gen, 'generations', None)
+                if generations and getattr(generations[0], 'text', None):
+                    return generations[0].text.strip()
+        except Exception as e:
+            raise self._technical_error(e) from e
+        raise ProviderError(self.name, "Die Antwort des Cohere-Modells konnte nicht interpretiert werden.")
+
+    async def _stream(self, messages):
+        prompt = self._prompt(messages)
+        events = self.client.chat_stream(model=self.model, message=prompt, temperature=0.7)
+        try:
+            async for event in events:
+                event_type = getattr(event, 'event_type', None)
+                if event_type == 'text-generation' and event.text:
+                    yield event.text
+                elif event_type == 'stream-end':
+                    self._record_meta(getattr(getattr(event, 'response', None), 'meta', None))
+        except Exception as e:
+            raise self._technical_error(e) from e
+        finally:
+            aclose = getattr(events, 'aclose', None)
+            if aclose:
+                await aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class LocalProvider(BaseProvider):
+    """In-Process-Inferenz auf der CPU (llama.cpp, GGUF-Modell), siehe ``local_llm``."""
+
+    name = 'local'
+
+    def __init__(self, model_path, slots=2, threads=None, n_ctx=4096, max_queue=64, max_tokens=400,
+                 chat_format=None, warmup_messages=None, **kwargs):
+        super().__init__(os.path.basename(model_path or '') or 'local', **kwargs)
+        self.model_path = model_path
+        self.max_tokens = max_tokens
+        self._engine_options = dict(slots=slots, threads=threads, n_ctx=n_ctx, max_queue=max_queue,
+                                    chat_format=chat_format)
+        self._warmup_messages = warmup_messages
+        self._engine = None
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    if not self.model_path or not os.path.exists(self.model_path):
+                        raise ProviderError(self.name, "Lokales Modell nicht gefunden. Bitte 'LOCAL_MODEL_PATH' (GGUF-Datei) in der .env-Datei setzen.")
+                    if importlib.util.find_spec('llama_cpp') is None:
+                        raise ProviderError(self.name, "Für das lokale Modell fehlt 'llama-cpp-python' (pip install llama-cpp-python).")
+                    from local_llm import LocalEngine
+                    engine = LocalEngine(self.model_path, **self._engine_options)
+                    engine.start(self._warmup_messages)
+                    self._engine = engine
+        return self._engine
+
+    def warmup(self):
+        """Lädt das Modell im Hintergrund vor, statt beim ersten Request."""
+        try:
+            self.engine
+        except ProviderError as e:
+            logging.error(f"Warm-up des lokalen Modells: {e}")
+
+    def engine_stats(self):
+        return self._engine.stats() if self._engine is not None else dict(loaded=False)
+
+    async def _stream(self, messages):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def emit(kind, value):
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+            except RuntimeError:
+                pass  # Loop beim Beenden bereits geschlossen
+
+        job = self.engine.submit(messages, emit, self.max_tokens, 0.7)
+        if job is None:
+            raise ProviderError(self.name, "Das lokale Modell ist ausgelastet. Bitte gleich erneut versuchen.", 503)
+        try:
+            while True:
+                kind, value = await events.get()
+                if kind == 'token':
+                    yield value
+                elif kind == 'done':
+                    self._usage(completion_tokens=value)
+                    return
+                else:
+                    raise ProviderError(self.name, f"Es ist ein technischer Fehler (lokales Modell) aufgetreten: {value}")
+        finally:
+            # Abbruch durch den Client: Slot sofort für die nächste Anfrage freigeben
+            job.cancel()
+
+    async def _complete(self, messages):
+        return ''.join([delta async for delta in self._stream(messages)]).strip()
+
+    async def aclose(self):
+        if self._engine is not None:
+            self._engine.close()
+
+
+_providers = []
+
+
+def register(provider):
+    """Merkt sich einen Provider, damit seine Pools beim Beenden geschlossen werden."""
+    _providers.append(provider)
+    return provider
+
+
+@atexit.register
+def _shutdown():
+    if event_loop._loop is None:
+        return
+    for provider in _providers:
+        try:
+            event_loop.run(provider.aclose(), timeout=5)
+        except Exception:
+            pass
+    event_loop.stop()
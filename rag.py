@@ -0,0 +1,402 @@
+"""Lokale Retrieval-Engine (BM25) über einen Ordner mit sportmedizinischen Leitlinien.
+
+Aufbau des Index-Verzeichnisses::
+
+    manifest.json          Segmente, indizierte Dateien, gelöschte Chunks
+    seg-<id>/vocab.json    Term -> [Offset, Anzahl] in den Postings
+    seg-<id>/doc_ids.npy   Postings: Chunk-IDs (int32), nach Term gruppiert
+    seg-<id>/tfs.npy       Postings: Termfrequenzen (float32)
+    seg-<id>/doc_len.npy   Chunk-Längen in Tokens (float32)
+    seg-<id>/texts.bin     Chunk-Texte (UTF-8, hintereinander)
+    seg-<id>/offsets.npy   Byte-Offsets der Chunk-Texte (int64, n+1)
+    seg-<id>/sources.json  Quelldatei je Chunk
+
+Die Arrays werden per ``np.load(mmap_mode='r')`` gemappt, sodass sich alle
+Gunicorn-Worker die Seiten im Page-Cache teilen. Neue oder geänderte Dateien
+landen beim Re-Indexieren in einem neuen Segment, alte Chunks werden nur als
+gelöscht markiert; ``compact`` fasst die Segmente bei Bedarf zusammen.
+
+CLI::
+
+    python rag.py build <docs_dir> [--index-dir rag_index]
+    python rag.py query "Knieschmerzen beim Laufen" [--index-dir rag_index]
+    python rag.py compact [--index-dir rag_index]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+import numpy as np
+
+DOC_EXTENSIONS = ('.txt', '.md')
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+MANIFEST = 'manifest.json'
+
+Passage = namedtuple('Passage', ['text', 'source', 'score'])
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset("""
+der die das den dem des ein eine einer eines einem einen und oder aber ich du er sie es wir ihr
+mein meine dein deine sein seine ist sind war bin bist hat habe haben wird werden kann können
+nach vor bei beim mit ohne von vom zu zum zur im in an am auf aus für über unter um was wie wo
+wann warum nicht kein keine auch noch nur sehr so sich mir mich dir dich the a an and or of to is
+""".split())
+_SUFFIXES = ('ungen', 'ung', 'en', 'er', 'es', 'e', 'n', 's')
+
+
+def tokenize(text):
+    """Kleinschreibung, Stoppwörter entfernen, einfache deutsche Suffix-Kürzung."""
+    tokens = []
+    for word in _TOKEN.findall(text.lower()):
+        if len(word) < 2 or word in _STOPWORDS or word.isdigit():
+            continue
+        if len(word) > 5:
+            for suffix in _SUFFIXES:
+                if word.endswith(suffix):
+                    word = word[:-len(suffix)]
+                    break
+        tokens.append(word)
+    return tokens
+
+
+def chunk_text(text, size=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Zerlegt einen Text in überlappende Wortfenster, bevorzugt an Absatzgrenzen."""
+    chunks, current = [], []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > size:
+            chunks.append(' '.join(current))
+            current = current[-overlap:] if overlap else []
+        current.extend(words)
+        while len(current) > size:
+            chunks.append(' '.join(current[:size]))
+            current = current[size - overlap:]
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _file_fingerprint(path):
+    st = os.stat(path)
+    return {'mtime': st.st_mtime, 'size': st.st_size}
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+### --- Schreiben ---
+def _write_segment(index_dir, chunks):
+    """Schreibt ein neues Segment aus [(text, source), ...] und gibt dessen Namen zurück."""
+    name = f"seg-{time.time_ns():x}"
+    tmp_dir = os.path.join(index_dir, name + '.tmp')
+    os.makedirs(tmp_dir)
+
+    postings = defaultdict(list)
+    doc_len = np.zeros(len(chunks), dtype=np.float32)
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    sources = []
+    with open(os.path.join(tmp_dir, 'texts.bin'), 'wb') as texts:
+        for doc_id, (text, source) in enumerate(chunks):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+            data = text.encode('utf-8')
+            texts.write(data)
+            offsets[doc_id + 1] = offsets[doc_id] + len(data)
+            sources.append(source)
+
+    vocab = {}
+    total = sum(len(p) for p in postings.values())
+    doc_ids = np.empty(total, dtype=np.int32)
+    tfs = np.empty(total, dtype=np.float32)
+    pos = 0
+    for term in sorted(postings):
+        entries = postings[term]
+        vocab[term] = [pos, len(entries)]
+        for doc_id, tf in entries:
+            doc_ids[pos] = doc_id
+            tfs[pos] = tf
+            pos += 1
+
+    np.save(os.path.join(tmp_dir, 'doc_ids.npy'), doc_ids)
+    np.save(os.path.join(tmp_dir, 'tfs.npy'), tfs)
+    np.save(os.path.join(tmp_dir, 'doc_len.npy'), doc_len)
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    with open(os.path.join(tmp_dir, 'vocab.json'), 'w', encoding='utf-8') as fh:
+        json.dump(vocab, fh, ensure_ascii=False, separators=(',', ':'))
+    with open(os.path.join(tmp_dir, 'sources.json'), 'w', encoding='utf-8') as fh:
+        json.dump(sources, fh, ensure_ascii=False)
+    os.rename(tmp_dir, os.path.join(index_dir, name))
+    return name
+
+
+def _load_manifest(index_dir):
+    path = os.path.join(index_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'segments': [], 'files': {}, 'deleted': {}}
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _save_manifest(index_dir, manifest):
+    """Atomar ersetzen, damit lesende Worker nie einen halben Stand sehen."""
+    path = os.path.join(index_dir, MANIFEST)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _remove_unreferenced_segments(index_dir, manifest):
+    live = {seg['name'] for seg in manifest['segments']}
+    for entry in os.listdir(index_dir):
+        if entry.startswith('seg-') and entry not in live:
+            shutil.rmtree(os.path.join(index_dir, entry), ignore_errors=True)
+
+
+def build_index(docs_dir, index_dir, compact_ratio=0.3, max_segments=8):
+    """Indiziert neue/geänderte Dateien inkrementell. Gibt eine Statistik zurück."""
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = _load_manifest(index_dir)
+    files = manifest['files']
+    seen, changed = set(), []
+
+    for root, _, names in os.walk(docs_dir):
+        for fname in sorted(names):
+            if not fname.lower().endswith(DOC_EXTENSIONS):
+                continue
+            path = os.path.join(root, fname)
+            rel = os.path.relpath(path, docs_dir)
+            seen.add(rel)
+            fingerprint = _file_fingerprint(path)
+            known = files.get(rel)
+            if known and known['mtime'] == fingerprint['mtime'] and known['size'] == fingerprint['size']:
+                continue
+            sha1 = _sha1(path)
+            if known and known.get('sha1') == sha1:
+                known.update(fingerprint)
+                continue
+            changed.append((rel, path, dict(fingerprint, sha1=sha1)))
+
+    removed = [rel for rel in files if rel not in seen]
+    for rel in removed + [rel for rel, _, _ in changed if rel in files]:
+        old = files.pop(rel)
+        if old.get('segment') is None:
+            continue  # Datei ohne Chunks (z. B. leer): nichts zu löschen
+        manifest['deleted'].setdefault(old['segment'], []).extend(range(old['first'], old['first'] + old['count']))
+
+    chunks = []
+    for rel, path, fingerprint in changed:
+        with open(path, encoding='utf-8', errors='replace') as fh:
+            pieces = chunk_text(fh.read())
+        files[rel] = dict(fingerprint, segment=None, first=len(chunks), count=len(pieces))
+        chunks.extend((piece, rel) for piece in pieces)
+
+    if chunks:
+        name = _write_segment(index_dir, chunks)
+        manifest['segments'].append({'name': name, 'size': len(chunks)})
+        for rel, _, _ in changed:
+            if files[rel]['count']:
+                files[rel]['segment'] = name
+
+    _save_manifest(index_dir, manifest)
+    total = sum(seg['size'] for seg in manifest['segments'])
+    deleted = sum(len(ids) for ids in manifest['deleted'].values())
+    if total and (deleted / total > compact_ratio or len(manifest['segments']) > max_segments):
+        compact_index(index_dir)
+    else:
+        _remove_unreferenced_segments(index_dir, manifest)
+    return {'added_files': len(changed), 'removed_files': len(removed), 'added_chunks': len(chunks)}
+
+
+def compact_index(index_dir):
+    """Fasst alle Segmente zu einem zusammen und entfernt gelöschte Chunks."""
+    manifest = _load_manifest(index_dir)
+    chunks, remap = [], {}
+    for seg in manifest['segments']:
+        segment = _Segment(os.path.join(index_dir, seg['name']), manifest['deleted'].get(seg['name'], ()))
+        for doc_id in np.flatnonzero(segment.live):
+            remap[(seg['name'], int(doc_id))] = len(chunks)
+            chunks.append((segment.text(doc_id), segment.sources[doc_id]))
+
+    # Dateien ohne Chunks bleiben bekannt, damit sie nicht bei jedem Build neu gelesen werden
+    new_manifest = {'segments': [], 'deleted': {},
+                    'files': {rel: info for rel, info in manifest['files'].items() if info.get('segment') is None}}
+    if chunks:
+        name = _write_segment(index_dir, chunks)
+        new_manifest['segments'].append({'name': name, 'size': len(chunks)})
+        for rel, info in manifest['files'].items():
+            if info.get('segment') is None:
+                continue
+            first = remap.get((info['segment'], info['first']))
+            if first is None:
+                continue
+            new_manifest['files'][rel] = dict(info, segment=name, first=first)
+    _save_manifest(index_dir, new_manifest)
+    _remove_unreferenced_segments(index_dir, new_manifest)
+    return {'chunks': len(chunks)}
+
+
+### --- Lesen ---
+class _Segment:
+    """Ein memory-gemapptes Segment."""
+
+    def __init__(self, path, deleted=()):
+        self.path = path
+        self.doc_ids = np.load(os.path.join(path, 'doc_ids.npy'), mmap_mode='r')
+        self.tfs = np.load(os.path.join(path, 'tfs.npy'), mmap_mode='r')
+        self.doc_len = np.load(os.path.join(path, 'doc_len.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.texts = np.memmap(os.path.join(path, 'texts.bin'), dtype=np.uint8, mode='r') \
+            if self.offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        with open(os.path.join(path, 'vocab.json'), encoding='utf-8') as fh:
+            self.vocab = json.load(fh)
+        with open(os.path.join(path, 'sources.json'), encoding='utf-8') as fh:
+            self.sources = json.load(fh)
+        self.size = len(self.doc_len)
+        self.live = np.ones(self.size, dtype=bool)
+        if deleted:
+            self.live[np.fromiter(deleted, dtype=np.int64)] = False
+
+    def text(self, doc_id):
+        start, end = int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+        return bytes(self.texts[start:end]).decode('utf-8')
+
+
+class RagIndex:
+    """Lazy geladener, thread-sicherer BM25-Index mit automatischem Reload."""
+
+    def __init__(self, index_dir, reload_check_sec=5.0):
+        self.index_dir = index_dir
+        self.reload_check_sec = reload_check_sec
+        self._segments = None
+        self._manifest_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._avgdl = 1.0
+        self._live_docs = 0
+
+    def _manifest_mtime_now(self):
+        try:
+            return os.stat(os.path.join(self.index_dir, MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._segments is not None and now < self._next_check:
+            return
+        with self._lock:
+            if self._segments is not None and now < self._next_check:
+                return
+            self._next_check = now + self.reload_check_sec
+            mtime = self._manifest_mtime_now()
+            if self._segments is not None and mtime == self._manifest_mtime:
+                return
+            manifest = _load_manifest(self.index_dir)
+            segments = [
+                _Segment(os.path.join(self.index_dir, seg['name']), manifest['deleted'].get(seg['name'], ()))
+                for seg in manifest['segments']
+            ]
+            live_docs = sum(int(s.live.sum()) for s in segments)
+            total_len = sum(float(s.doc_len[s.live].sum()) for s in segments)
+            self._avgdl = (total_len / live_docs) if live_docs else 1.0
+            self._live_docs = live_docs
+            self._segments = segments
+            self._manifest_mtime = mtime
+
+    def search(self, query, k=3, min_score=0.0):
+        """Top-k Passagen nach BM25."""
+        self._ensure_loaded()
+        segments, avgdl, n_docs = self._segments, self._avgdl, self._live_docs
+        terms = set(tokenize(query))
+        if not terms or not n_docs:
+            return []
+
+        df = Counter()
+        for segment in segments:
+            for term in terms:
+                entry = segment.vocab.get(term)
+                if entry:
+                    df[term] += entry[1]
+
+        candidates = []
+        for segment in segments:
+            # Nur die Postings der Query-Terme anfassen: Aufwand ~ Postings, nicht ~ Korpusgröße
+            ids_parts, score_parts = [], []
+            for term in terms:
+                entry = segment.vocab.get(term)
+                if not entry:
+                    continue
+                idf = math.log(1.0 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+                start, count = entry
+                ids = segment.doc_ids[start:start + count]
+                tf = segment.tfs[start:start + count]
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * segment.doc_len[ids] / avgdl)
+                ids_parts.append(ids)
+                score_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+            if not ids_parts:
+                continue
+            doc_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+            scores[~segment.live[doc_ids]] = 0.0
+            top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+            candidates.extend((float(scores[i]), segment, int(doc_ids[i])) for i in top if scores[i] > min_score)
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [Passage(segment.text(doc_id), segment.sources[doc_id], score)
+                for score, segment, doc_id in candidates[:k]]
+
+
+def format_context(passages):
+    """Formatiert Passagen als Kontextblock für den System-Prompt."""
+    lines = ["Kontext aus sportmedizinischen Leitlinien (nur verwenden, wenn relevant; keine Diagnosen ableiten):"]
+    for i, passage in enumerate(passages, 1):
+        lines.append(f"[{i}] ({passage.source}) {passage.text}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lokaler RAG-Index (BM25) für Leitlinien-Dokumente')
+    parser.add_argument('--index-dir', default=os.getenv('RAG_INDEX_DIR', 'rag_index'))
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Dokumente (inkrementell) indizieren')
+    build.add_argument('docs_dir')
+    query = sub.add_parser('query', help='Index abfragen')
+    query.add_argument('text')
+    query.add_argument('-k', type=int, default=3)
+    sub.add_parser('compact', help='Segmente zusammenfassen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        print(json.dumps(build_index(args.docs_dir, args.index_dir)))
+    elif args.command == 'compact':
+        print(json.dumps(compact_index(args.index_dir)))
+    else:
+        start = time.perf_counter()
+        passages = RagIndex(args.index_dir).search(args.text, k=args.k)
+        for p in passages:
+            print(f"{p.score:.3f}  {p.source}: {p.text[:120]}")
+        print(f"({(time.perf_counter() - start) * 1000:.1f} ms inkl. Laden)")
+
+
+if __name__ == '__main__':
+    main()
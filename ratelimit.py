@@ -0,0 +1,154 @@
+"""Rate Limiting nach GCRA (Generic Cell Rate Algorithm).
+
+Pro Schlüssel wird nur ein einziger Zeitstempel gespeichert, die
+"theoretical arrival time" (TAT). Erlaubt sind ``limit`` Anfragen als Burst,
+danach eine Anfrage pro ``window / limit`` Sekunden. Ein Schlüssel ist
+überflüssig, sobald seine TAT in der Vergangenheit liegt; genau dann wird er
+per TTL entfernt.
+
+Backends:
+- ``MemoryBackend``: pro Prozess (Entwicklung, Einzelprozess)
+- ``SQLiteBackend``: geteilte Datei, korrekt über alle Gunicorn-Worker eines Hosts
+- ``RedisBackend``: korrekt über Worker und Nodes (optionales Paket ``redis``)
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'retry_after', 'remaining'])
+
+
+def gcra(tat, now, emission_interval, limit):
+    """Ein GCRA-Schritt. Returns (allowed, new_tat, retry_after, remaining)."""
+    tat = max(tat or 0.0, now)
+    new_tat = tat + emission_interval
+    allow_at = new_tat - emission_interval * limit
+    if now < allow_at:
+        remaining = 0
+        return False, tat, allow_at - now, remaining
+    remaining = int((now - allow_at) / emission_interval)
+    return True, new_tat, 0.0, min(remaining, limit - 1)
+
+
+class MemoryBackend:
+    """In-Process: dict key -> TAT, abgelaufene Schlüssel werden periodisch entfernt."""
+
+    def __init__(self, sweep_interval_sec=30.0):
+        self._tats = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval_sec
+        self._next_sweep = 0.0
+
+    def hit(self, key, now, emission_interval, limit):
+        with self._lock:
+            if now >= self._next_sweep:
+                self._tats = {k: tat for k, tat in self._tats.items() if tat > now}
+                self._next_sweep = now + self._sweep_interval
+            allowed, new_tat, retry_after, remaining = gcra(self._tats.get(key), now, emission_interval, limit)
+            if allowed:
+                self._tats[key] = new_tat
+            return allowed, retry_after, remaining
+
+    def __len__(self):
+        return len(self._tats)
+
+
+class SQLiteBackend:
+    """Geteilte SQLite-Datei; ``BEGIN IMMEDIATE`` serialisiert die Schritte aller Prozesse."""
+
+    def __init__(self, path, sweep_interval_sec=60.0):
+        self.path = path
+        self._local = threading.local()
+        self._sweep_interval = sweep_interval_sec
+        self._next_sweep = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, now, emission_interval, limit):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if now >= self._next_sweep:
+                conn.execute("DELETE FROM rate_limit WHERE tat <= ?", (now,))
+                self._next_sweep = now + self._sweep_interval
+            row = conn.execute("SELECT tat FROM rate_limit WHERE key = ?", (key,)).fetchone()
+            allowed, new_tat, retry_after, remaining = gcra(row[0] if row else None, now, emission_interval, limit)
+            if allowed:
+                conn.execute(
+                    "INSERT INTO rate_limit (key, tat) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, new_tat)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after, remaining
+
+
+class RedisBackend:
+    """Redis mit Lua-Skript: ein atomarer Round-Trip pro Anfrage, TTL per PEXPIRE."""
+
+    SCRIPT = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+if not tat or tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - interval * limit
+if now < allow_at then
+  return {0, tostring(allow_at - now), 0}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0', math.min(math.floor((now - allow_at) / interval), limit - 1)}
+"""
+
+    def __init__(self, url, prefix='rl:'):
+        import redis  # optionaler Import, nur falls konfiguriert
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    def hit(self, key, now, emission_interval, limit):
+        allowed, retry_after, remaining = self._script(
+            keys=[self.prefix + key], args=[repr(now), repr(emission_interval), limit]
+        )
+        return bool(allowed), float(retry_after), int(remaining)
+
+
+class RateLimiter:
+    """``limit`` Anfragen pro ``window_sec`` Sekunden (Burst = limit)."""
+
+    def __init__(self, backend, limit, window_sec, clock=time.time):
+        self.backend = backend
+        self.limit = limit
+        self.emission_interval = window_sec / float(limit)
+        self._clock = clock
+
+    def hit(self, key):
+        allowed, retry_after, remaining = self.backend.hit(key, self._clock(), self.emission_interval, self.limit)
+        return RateLimitResult(allowed, math.ceil(retry_after) if not allowed else 0, remaining)
+
+
+def create_backend(name, sqlite_path=None, redis_url=None):
+    """Backend aus Konfiguration (memory | sqlite | redis)."""
+    name = (name or 'memory').lower()
+    if name == 'redis':
+        return RedisBackend(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path or 'ratelimit.sqlite3')
+    return MemoryBackend()
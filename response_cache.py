@@ -0,0 +1,200 @@
+"""Antwort-Cache für wiederkehrende Fragen ohne Verlauf.
+
+Zwei Stufen:
+1. Exakt: normalisierte Frage + Scope (System-Prompt, Modell) in einem LRU mit TTL.
+2. Ähnlich: TF-IDF-Kosinusähnlichkeit über Wörter und Zeichen-Trigramme innerhalb
+   desselben Scopes, ab einem konfigurierbaren Schwellwert.
+
+Der normierte Vektor eines Eintrags wird beim Schreiben berechnet (IDF zu
+diesem Zeitpunkt eingefroren). Bei einem Fehlschlag werden unter dem Lock nur
+die Kandidaten mit den seltensten gemeinsamen Termen (höchstens
+``max_candidates``) kopiert; bewertet wird außerhalb des Locks.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Kleinschreibung, Unicode-NFKC, ohne Satzzeichen und doppelte Leerzeichen."""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = _NON_WORD.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def make_scope(*parts):
+    """Stabiler Schlüssel für alles, was die Antwort außer der Frage beeinflusst."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def _terms(normalized):
+    """Wörter plus Zeichen-Trigramme (robust gegen Komposita wie 'Knieschmerzen')."""
+    terms = Counter()
+    for word in normalized.split():
+        terms['w:' + word] += 1
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            terms['c:' + padded[i:i + 3]] += 1
+    return terms
+
+
+class _Entry:
+    __slots__ = ('answer', 'expires_at', 'terms', 'scope', 'vector')
+
+    def __init__(self, answer, expires_at, terms, scope, vector):
+        self.answer = answer
+        self.expires_at = expires_at
+        self.terms = terms
+        self.scope = scope
+        self.vector = vector  # wird nie verändert, darf ohne Lock gelesen werden
+
+
+class ResponseCache:
+    """Thread-sicherer LRU/TTL-Cache mit optionaler Ähnlichkeitssuche."""
+
+    def __init__(self, max_entries=1024, ttl_sec=3600, similarity_threshold=0.9, max_candidates=64):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+        self._entries = OrderedDict()   # (scope, normalized) -> _Entry
+        self._postings = {}             # term -> set of keys
+        self._df = Counter()            # term -> Anzahl Einträge
+        self._lock = threading.Lock()
+        self.counters = Counter(exact_hits=0, similar_hits=0, misses=0, bypassed=0, stores=0, evictions=0)
+
+    def _idf(self, term):
+        return math.log((1 + len(self._entries)) / (1 + self._df[term])) + 1.0
+
+    def _weights(self, terms):
+        weights = {t: (1 + math.log(tf)) * self._idf(t) for t, tf in terms.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {t: w / norm for t, w in weights.items()}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for term in entry.terms:
+            self._df[term] -= 1
+            if self._df[term] <= 0:
+                del self._df[term]
+            keys = self._postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[term]
+
+    def _get_live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def bypass(self):
+        """Zählt eine Anfrage, die den Cache bewusst umgeht (z. B. wegen Verlauf)."""
+        with self._lock:
+            self.counters['bypassed'] += 1
+
+    def get(self, question, scope):
+        """Liefert (answer, tier) mit tier 'exact'/'similar' oder (None, None)."""
+        normalized = normalize_question(question)
+        key = (scope, normalized)
+        now = time.monotonic()
+        similar = bool(self.similarity_threshold) and self.similarity_threshold < 1.0
+        terms = _terms(normalized) if similar else None
+        with self._lock:
+            entry = self._get_live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters['exact_hits'] += 1
+                return entry.answer, 'exact'
+            if not similar:
+                self.counters['misses'] += 1
+                return None, None
+            query = self._weights(terms)
+            candidates = self._candidates(terms, scope, now)
+
+        match = self._most_similar(query, candidates)
+        with self._lock:
+            entry = self._get_live(match, now) if match is not None else None
+            if entry is not None:
+                self._entries.move_to_end(match)
+                self.counters['similar_hits'] += 1
+                return entry.answer, 'similar'
+            self.counters['misses'] += 1
+            return None, None
+
+    def _candidates(self, terms, scope, now):
+        """(key, vector) der Einträge mit den seltensten gemeinsamen Termen, höchstens ``max_candidates``."""
+        seen, candidates = set(), []
+        for term in sorted(terms, key=lambda t: self._df[t]):
+            for key in self._postings.get(term, ()):
+                if key in seen or key[0] != scope:
+                    continue
+                seen.add(key)
+                entry = self._entries[key]
+                if entry.expires_at > now:
+                    candidates.append((key, entry.vector))
+                    if len(candidates) >= self.max_candidates:
+                        return candidates
+        return candidates
+
+    def _most_similar(self, query, candidates):
+        """Läuft ohne Lock: die Vektoren der Einträge sind unveränderlich."""
+        best_key, best_score = None, self.similarity_threshold
+        for key, doc in candidates:
+            score = sum(w * doc.get(t, 0.0) for t, w in query.items())
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def put(self, question, scope, answer):
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        key = (scope, normalized)
+        terms = _terms(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            for term in terms:
+                self._df[term] += 1
+                self._postings.setdefault(term, set()).add(key)
+            entry = self._entries[key] = _Entry(answer, time.monotonic() + self.ttl_sec, terms, scope, None)
+            entry.vector = self._weights(terms)
+            self.counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._df.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters['exact_hits'] + counters['similar_hits'] + counters['misses']
+        hits = counters['exact_hits'] + counters['similar_hits']
+        counters.update(
+            entries=size,
+            hit_ratio=round(hits / lookups, 4) if lookups else 0.0,
+            similarity_threshold=self.similarity_threshold,
+        )
+        return counters
@@ -0,0 +1,265 @@
+"""Provider-Router: Failover, Hedging und Circuit Breaker über mehrere Provider.
+
+Der Router verhält sich wie ein einzelner Provider (``complete``/``stream``)
+und verteilt Anfragen in der konfigurierten Reihenfolge:
+
+- Pro Provider werden Latenzen (rollierend), Fehlerquote und ein Circuit
+  Breaker geführt. Nach ``failure_threshold`` Fehlern in Folge oder einer
+  Fehlerquote über ``error_rate_threshold`` wird der Provider für
+  ``cooldown_sec`` übersprungen; danach darf eine einzelne Probe-Anfrage durch
+  (half-open).
+- Bei 429, 5xx, Timeouts und Verbindungsfehlern wird automatisch auf den
+  nächsten Provider gewechselt; andere Fehler (z. B. 400) werden direkt gemeldet.
+- Hedging (optional, nur ``complete``): Antwortet der Provider nicht innerhalb
+  seiner p95-Latenz (mindestens ``hedge_min_delay_sec``), wird zusätzlich der
+  nächste Provider gefragt; die erste Antwort gewinnt, die andere wird
+  abgebrochen.
+- Jede Anfrage hat eine Deadline (``deadline_sec``); beim Streaming gilt sie
+  bis zum ersten Token, ein Wechsel ist nur vor dem ersten Token möglich.
+
+Alle Methoden laufen auf der Provider-Eventloop, der Zustand braucht daher
+keine Sperren.
+"""
+import asyncio
+import time
+from collections import deque
+
+import metrics
+from providers import ProviderError
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def is_retryable(error):
+    """429, 5xx, 408 und Fehler ohne Status (Timeout, Verbindung) -> anderer Provider."""
+    code = error.status_code
+    return code is None or code in (408, 429) or code >= 500
+
+
+class ProviderHealth:
+    """Rollierende Latenz/Fehlerquote und Circuit Breaker eines Providers."""
+
+    def __init__(self, provider, failure_threshold=5, error_rate_threshold=0.5, min_samples=20,
+                 cooldown_sec=30.0, window=100, clock=time.monotonic):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown_sec = cooldown_sec
+        self._clock = clock
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown_sec:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """Darf eine Anfrage an diesen Provider gehen? Reserviert ggf. die Probe."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._state = HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency=None):
+        if latency is not None:
+            self._latencies.append(latency)
+        self._outcomes.append(True)
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        self._state = CLOSED
+
+    def record_failure(self):
+        self._outcomes.append(False)
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold or (
+                len(self._outcomes) >= self.min_samples and self.error_rate >= self.error_rate_threshold):
+            self._trip()
+
+    def release(self):
+        """Abgebrochene Anfrage (z. B. verlorener Hedge): zählt weder als Erfolg noch als Fehler."""
+        self._probe_in_flight = False
+
+    def _trip(self):
+        if self._state != OPEN:
+            metrics.record_circuit_open(self.provider.name)
+        self._state = OPEN
+        self._opened_at = self._clock()
+        # Fehlerquote nach dem Öffnen neu aufbauen
+        self._outcomes.clear()
+
+    @property
+    def error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def p95(self):
+        """p95 der letzten Latenzen oder None, solange zu wenige Messwerte vorliegen."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def stats(self):
+        p95 = self.p95()
+        stats = dict(
+            provider=self.provider.name,
+            model=self.provider.model,
+            state=self.state,
+            error_rate=round(self.error_rate, 3),
+            consecutive_failures=self._consecutive_failures,
+            p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+            in_flight=self.provider.in_flight,
+            tokens=dict(self.provider.tokens),
+        )
+        if hasattr(self.provider, 'engine_stats'):
+            stats['engine'] = self.provider.engine_stats()  # lokales Modell: Slots, Warteschlange
+        return stats
+
+
+class ProviderRouter:
+    """Verhält sich wie ein Provider, verteilt aber auf mehrere (Reihenfolge = Priorität)."""
+
+    name = 'router'
+
+    def __init__(self, providers, hedge=False, hedge_min_delay_sec=0.5, deadline_sec=45.0, **health_options):
+        if not providers:
+            raise ValueError('ProviderRouter braucht mindestens einen Provider')
+        self.providers = list(providers)
+        self.health = [ProviderHealth(p, **health_options) for p in self.providers]
+        self.hedge = hedge and len(self.providers) > 1
+        self.hedge_min_delay_sec = hedge_min_delay_sec
+        self.deadline_sec = deadline_sec
+        self.model = ','.join(f'{p.name}:{p.model}' for p in self.providers)
+
+    @property
+    def in_flight(self):
+        return sum(p.in_flight for p in self.providers)
+
+    def _candidates(self):
+        """Verfügbare Provider in Prioritätsreihenfolge; sind alle gesperrt, trotzdem der erste."""
+        yielded = False
+        for health in self.health:
+            if health.allow():
+                yielded = True
+                yield health
+        if not yielded:
+            yield self.health[0]
+
+    def _deadline_error(self):
+        return ProviderError(self.name, "Die KI-Antwort hat zu lange gedauert. Bitte später erneut versuchen.", 504)
+
+    async def _call(self, health, messages):
+        start = time.perf_counter()
+        try:
+            answer = await health.provider.complete(messages)
+        except ProviderError:
+            health.record_failure()
+            raise
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        health.record_success(time.perf_counter() - start)
+        return answer
+
+    def _hedge_delay(self, health):
+        p95 = health.p95()
+        if p95 is None:
+            return None  # ohne Messwerte kein Hedging
+        return max(self.hedge_min_delay_sec, p95)
+
+    async def complete(self, messages):
+        """Liefert die erste erfolgreiche Antwort (Failover/Hedging innerhalb der Deadline)."""
+        candidates = self._candidates()
+        pending = {}
+        hedged = False
+        last_error = None
+        try:
+            async with asyncio.timeout(self.deadline_sec):
+                while True:
+                    if not pending:
+                        health = next(candidates, None)
+                        if health is None:
+                            break
+                        pending[asyncio.ensure_future(self._call(health, messages))] = health
+                    delay = None
+                    if self.hedge and not hedged and len(pending) == 1:
+                        delay = self._hedge_delay(next(iter(pending.values())))
+                    done, _ = await asyncio.wait(set(pending), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        hedged = True
+                        backup = next(candidates, None)
+                        if backup is not None:
+                            metrics.record_hedge(backup.provider.name)
+                            pending[asyncio.ensure_future(self._call(backup, messages))] = backup
+                        continue
+                    for task in done:
+                        health = pending.pop(task)
+                        try:
+                            return task.result()
+                        except ProviderError as e:
+                            if not is_retryable(e):
+                                raise
+                            metrics.record_failover(health.provider.name)
+                            last_error = e
+        except TimeoutError:
+            raise self._deadline_error() from None
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def stream(self, messages):
+        """Streamt vom ersten verfügbaren Provider; Wechsel nur vor dem ersten Token."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_sec
+        last_error = None
+        for health in self._candidates():
+            deltas = health.provider.stream(messages)
+            started = False
+            try:
+                while True:
+                    timeout = None if started else max(0.0, deadline - loop.time())
+                    try:
+                        delta = await asyncio.wait_for(deltas.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    yield delta
+            except ProviderError as e:
+                health.record_failure()
+                if started or not is_retryable(e):
+                    raise
+                metrics.record_failover(health.provider.name)
+                last_error = e
+                continue
+            except TimeoutError:
+                health.record_failure()
+                raise self._deadline_error() from None
+            except (asyncio.CancelledError, GeneratorExit):
+                health.release()
+                raise
+            finally:
+                await deltas.aclose()
+            health.record_success()
+            return
+        raise last_error
+
+    def stats(self):
+        return [health.stats() for health in self.health]
+
+    async def aclose(self):
+        for provider in self.providers:
+            await provider.aclose()
@@ -4,6 +4,7 @@ AI-Sportverletzung-Assistant Launcher Script
 Starts the application with automatic dependency checking
 """
 
+import importlib.util
 import sys
 import subprocess
 import os
@@ -26,17 +27,14 @@ def check_virtual_env():
         print("   Recommendation: python -m venv .venv && source .venv/bin/activate")
 
 def check_dependencies():
-    """Check if all dependencies are installed"""
-    try:
-        import flask
-        import openai
-        import dotenv
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependencies: {e}")
+    """Check if all dependencies are installed (without importing them)"""
+    missing = [name for name in ('flask', 'openai', 'dotenv') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependencies: {', '.join(missing)}")
         print("   Run: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are installed")
+    return True
 
 def check_env_file():
     """Check if .env file exists and is configured"""
@@ -90,10 +88,11 @@ def main():
     
     # Start Flask application
     try:
-        from app import app, db
-        # Ensure database tables exist
+        from app import app, init_database, warmup_providers
+        # Ensure database schema is up to date (Alembic migrations)
         with app.app_context():
-            db.create_all()
+            init_database()
+        warmup_providers()  # preload the local model (PROVIDER=local)
         app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False, threaded=True)
     except KeyboardInterrupt:
         print("\n👋 Application stopped")
@@ -0,0 +1,494 @@
+"""Single-Flight: gleichzeitige identische Anfragen teilen sich einen Upstream-Aufruf.
+
+Innerhalb eines Prozesses hängen sich alle Threads mit demselben Schlüssel an
+einen laufenden Aufruf (``_Flight``) und bekommen dieselben Text-Deltas, auch
+beim Streaming. Wer gerade ein neues Stück braucht und niemanden treiben
+sieht, treibt den Upstream-Iterator selbst weiter; bricht ein Client ab,
+übernimmt ein anderer. Erst wenn der letzte Abonnent geht, wird der Upstream-
+Aufruf abgebrochen.
+
+Über Prozessgrenzen (Gunicorn-Worker) hinweg wählt ein geteiltes Backend
+(``sqlite`` oder ``redis``) einen Leader; dieser veröffentlicht die Deltas
+gebündelt, die anderen Worker lesen sie per Polling mit. Die Lease des
+Leaders ist kurz und wird per Heartbeat verlängert: stirbt der Leader-Prozess,
+merken es die Follower nach höchstens ``lease_sec``. Ist bis dahin nichts
+angekommen, ruft der Follower selbst den Provider auf. Bricht der Client des
+Leaders ab, während noch Follower lesen, läuft der Aufruf im Hintergrund für
+sie weiter; ohne Follower wird er abgebrochen.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+from providers import ProviderError
+
+FlightState = namedtuple('FlightState', ['chunks', 'done', 'error', 'status_code', 'alive'])
+
+_DRIVE = object()
+
+
+class _Flight:
+    def __init__(self, start):
+        self.start = start
+        self.source = None
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.driving = False
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """Bündelt gleichzeitige Aufrufe mit gleichem Schlüssel (Threads + optional Worker)."""
+
+    def __init__(self, backend=None, lease_sec=5.0, poll_interval_sec=0.025, publish_interval_sec=0.05):
+        self.backend = backend
+        self.lease_sec = lease_sec
+        self.poll_interval = poll_interval_sec
+        self.publish_interval = publish_interval_sec
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._leases = set()  # Schlüssel, für die dieser Prozess Leader ist
+        self._heartbeat = None
+        self._heartbeat_pid = None
+        self.counters = dict(flights=0, local=0, remote=0, handed_off=0)
+
+    def do(self, key, fn):
+        """``fn()`` läuft für alle gleichzeitigen Aufrufer mit ``key`` nur einmal."""
+        return ''.join(self.stream(key, lambda: iter((fn() or '',))))
+
+    def stream(self, key, start):
+        """Iterator über die Deltas von ``start()`` (wird nur vom ersten Aufrufer gestartet)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(start)
+                self.counters['flights'] += 1
+            else:
+                self.counters['local'] += 1
+                metrics.record_coalesced('local')
+            flight.subscribers += 1
+        return self._subscribe(key, flight)
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        return dict(self.counters, in_flight=in_flight, backend=type(self.backend).__name__ if self.backend else None)
+
+    # --- Abonnenten ---
+    def _subscribe(self, key, flight):
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.chunks) and not flight.done and flight.driving:
+                        flight.cond.wait()
+                    if index < len(flight.chunks):
+                        chunk = flight.chunks[index]
+                        index += 1
+                    elif flight.done:
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+                    else:
+                        flight.driving = True
+                        chunk = _DRIVE
+                if chunk is _DRIVE:
+                    self._drive(key, flight)
+                    continue
+                yield chunk
+        finally:
+            self._unsubscribe(key, flight)
+
+    def _drive(self, key, flight):
+        """Holt das nächste Delta vom Upstream (immer nur ein Thread gleichzeitig)."""
+        try:
+            if flight.source is None:
+                flight.source = self._source(key, flight.start)
+            chunk = next(flight.source)
+        except StopIteration:
+            self._finish(key, flight)
+        except Exception as e:
+            self._finish(key, flight, e)
+        else:
+            with flight.cond:
+                flight.chunks.append(chunk)
+        finally:
+            with flight.cond:
+                flight.driving = False
+                flight.cond.notify_all()
+
+    def _finish(self, key, flight, error=None):
+        with flight.cond:
+            flight.done = True
+            flight.error = error
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _unsubscribe(self, key, flight):
+        with self._lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done
+            if abandoned and self._flights.get(key) is flight:
+                del self._flights[key]
+        if abandoned and flight.source is not None:
+            # letzter Abonnent weg: Upstream-Aufruf abbrechen
+            flight.source.close()
+
+    # --- prozessübergreifend ---
+    def _source(self, key, start):
+        if self.backend is None:
+            return start()
+        try:
+            leader = self.backend.acquire(key, self.lease_sec)
+        except Exception as e:
+            logging.warning(f"Single-Flight-Backend nicht verfügbar: {e}")
+            return start()
+        if leader:
+            return self._publish(key, start)
+        self.counters['remote'] += 1
+        metrics.record_coalesced('remote')
+        return self._follow(key, start)
+
+    def _backend_call(self, method, *args):
+        try:
+            getattr(self.backend, method)(*args)
+        except Exception as e:
+            logging.warning(f"Single-Flight-Backend ({method}) fehlgeschlagen: {e}")
+
+    def _publish(self, key, start):
+        """Leader: reicht die Deltas durch und veröffentlicht sie gebündelt für andere Worker."""
+        publisher = _Publisher(self, key)
+        self._hold_lease(key)
+        source = start()
+        try:
+            for chunk in source:
+                publisher.push(chunk)
+                yield chunk
+        except GeneratorExit:
+            # eigener Client weg: für noch lesende Follower weiterlaufen, sonst abbrechen
+            if self._abandon(key):
+                self._drop_lease(key)
+                source.close()
+            else:
+                self.counters['handed_off'] += 1
+                threading.Thread(target=self._drain, args=(publisher, source),
+                                 name='single-flight-drain', daemon=True).start()
+            raise
+        except ProviderError as e:
+            publisher.fail(e)
+            raise
+        except Exception:
+            self._drop_lease(key)
+            self._backend_call('release', key)
+            raise
+        publisher.finish()
+
+    def _drain(self, publisher, source):
+        try:
+            for chunk in source:
+                publisher.push(chunk)
+        except ProviderError as e:
+            publisher.fail(e)
+        except Exception as e:
+            logging.warning(f"Single-Flight: Hintergrund-Aufruf fehlgeschlagen: {e}")
+            self._drop_lease(publisher.key)
+            self._backend_call('release', publisher.key)
+        else:
+            publisher.finish()
+        finally:
+            source.close()
+
+    def _abandon(self, key):
+        """True, falls niemand mehr mitliest (Eintrag gelöscht); bei Backend-Fehlern ebenfalls True."""
+        try:
+            return self.backend.abandon(key)
+        except Exception as e:
+            logging.warning(f"Single-Flight-Backend (abandon) fehlgeschlagen: {e}")
+            return True
+
+    # --- Heartbeat: kurze Lease, solange der Leader lebt ---
+    def _hold_lease(self, key):
+        with self._lock:
+            self._leases.add(key)
+            if self._heartbeat is None or self._heartbeat_pid != os.getpid():
+                self._heartbeat_pid = os.getpid()  # nach fork gehört der Thread dem Elternprozess
+                self._heartbeat = threading.Thread(target=self._renew_leases, name='single-flight-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+
+    def _drop_lease(self, key):
+        with self._lock:
+            self._leases.discard(key)
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_sec / 3)
+            with self._lock:
+                keys = list(self._leases)
+            for key in keys:
+                self._backend_call('renew', key, self.lease_sec)
+
+    def _follow(self, key, start):
+        """Follower in einem anderen Worker: liest die Deltas des Leaders mit."""
+        try:
+            joined = self.backend.join(key, self.lease_sec)
+        except Exception as e:
+            logging.warning(f"Single-Flight-Backend (join) fehlgeschlagen: {e}")
+            joined = False
+        if not joined:
+            # Leader schon wieder weg (oder Backend gestört): selbst anfragen
+            yield from start()
+            return
+        seq = 0
+        try:
+            while True:
+                state = self.backend.read(key, seq)
+                for text in state.chunks:
+                    seq += 1
+                    yield text
+                if state.done:
+                    if state.error is not None:
+                        raise ProviderError('single-flight', state.error, state.status_code)
+                    return
+                if not state.alive:
+                    if seq == 0:
+                        # Leader ohne Ergebnis verschwunden: selbst anfragen
+                        yield from start()
+                        return
+                    raise ProviderError('single-flight', "Die Antwort wurde unterbrochen. Bitte erneut versuchen.")
+                time.sleep(self.poll_interval)
+        finally:
+            self._backend_call('leave', key)
+
+
+class _Publisher:
+    """Bündelt die Deltas des Leaders und schreibt sie ins Backend."""
+
+    def __init__(self, flight, key):
+        self.flight = flight
+        self.key = key
+        self.seq = 0
+        self.buffer = []
+        self.last = time.monotonic()
+
+    def push(self, chunk):
+        self.buffer.append(chunk)
+        if time.monotonic() - self.last >= self.flight.publish_interval:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.flight._backend_call('append', self.key, self.seq, ''.join(self.buffer), self.flight.lease_sec)
+            self.seq, self.buffer = self.seq + 1, []
+        self.last = time.monotonic()
+
+    def finish(self):
+        self._flush()
+        self.flight._drop_lease(self.key)
+        self.flight._backend_call('finish', self.key)
+
+    def fail(self, error):
+        self.flight._drop_lease(self.key)
+        self.flight._backend_call('finish', self.key, str(error), error.status_code)
+
+
+class SQLiteFlightBackend:
+    """Leader-Wahl und Delta-Austausch über eine geteilte SQLite-Datei (ein Host)."""
+
+    def __init__(self, path, result_ttl_sec=10.0):
+        self.path = path
+        self.result_ttl = result_ttl_sec
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS sf_flight (key TEXT PRIMARY KEY, expires REAL NOT NULL, "
+                     "done INTEGER NOT NULL DEFAULT 0, error TEXT, status INTEGER, "
+                     "followers INTEGER NOT NULL DEFAULT 0)")
+        try:
+            conn.execute("ALTER TABLE sf_flight ADD COLUMN followers INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # Spalte existiert bereits
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sf_flight_expires ON sf_flight (expires)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sf_chunk (key TEXT NOT NULL, seq INTEGER NOT NULL, "
+                     "text TEXT NOT NULL, PRIMARY KEY (key, seq))")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, *statements):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursors = [conn.execute(sql, params) for sql, params in statements]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursors
+
+    def acquire(self, key, lease_sec):
+        now = time.time()
+        cursors = self._transaction(
+            ("DELETE FROM sf_chunk WHERE key IN (SELECT key FROM sf_flight WHERE expires <= ?)", (now,)),
+            ("DELETE FROM sf_flight WHERE expires <= ?", (now,)),
+            ("INSERT OR IGNORE INTO sf_flight (key, expires) VALUES (?, ?)", (key, now + lease_sec)),
+        )
+        return cursors[-1].rowcount == 1
+
+    def append(self, key, seq, text, lease_sec):
+        self._transaction(
+            ("INSERT INTO sf_chunk (key, seq, text) VALUES (?, ?, ?)", (key, seq, text)),
+            ("UPDATE sf_flight SET expires = ? WHERE key = ?", (time.time() + lease_sec, key)),
+        )
+
+    def renew(self, key, lease_sec):
+        self._transaction(("UPDATE sf_flight SET expires = ? WHERE key = ? AND done = 0",
+                           (time.time() + lease_sec, key)))
+
+    def join(self, key, lease_sec):
+        cursors = self._transaction(("UPDATE sf_flight SET followers = followers + 1 WHERE key = ? AND expires > ?",
+                                     (key, time.time())))
+        return cursors[0].rowcount == 1
+
+    def leave(self, key):
+        self._transaction(("UPDATE sf_flight SET followers = MAX(followers - 1, 0) WHERE key = ?", (key,)))
+
+    def abandon(self, key):
+        cursors = self._transaction(
+            ("DELETE FROM sf_chunk WHERE key = ? AND NOT EXISTS "
+             "(SELECT 1 FROM sf_flight WHERE key = ? AND followers > 0)", (key, key)),
+            ("DELETE FROM sf_flight WHERE key = ? AND followers = 0", (key,)),
+        )
+        return cursors[-1].rowcount == 1 or self._conn().execute(
+            "SELECT 1 FROM sf_flight WHERE key = ?", (key,)).fetchone() is None
+
+    def finish(self, key, error=None, status_code=None):
+        # Ergebnis kurz aufbewahren, damit nachzügelnde Worker es noch lesen
+        self._transaction(("UPDATE sf_flight SET done = 1, error = ?, status = ?, expires = ? WHERE key = ?",
+                           (error, status_code, time.time() + self.result_ttl, key)))
+
+    def release(self, key):
+        self._transaction(("DELETE FROM sf_chunk WHERE key = ?", (key,)),
+                          ("DELETE FROM sf_flight WHERE key = ?", (key,)))
+
+    def read(self, key, from_seq):
+        conn = self._conn()
+        row = conn.execute("SELECT done, error, status, expires FROM sf_flight WHERE key = ?", (key,)).fetchone()
+        chunks = [text for (text,) in conn.execute(
+            "SELECT text FROM sf_chunk WHERE key = ? AND seq >= ? ORDER BY seq", (key, from_seq))]
+        if row is None:
+            return FlightState(chunks, False, None, None, False)
+        done, error, status, expires = row
+        return FlightState(chunks, bool(done), error, status, bool(done) or expires > time.time())
+
+
+class RedisFlightBackend:
+    """Wie SQLiteFlightBackend, aber über Redis (mehrere Nodes; optionales Paket ``redis``)."""
+
+    def __init__(self, url, prefix='sf:', result_ttl_sec=10.0):
+        import redis  # optionaler Import, nur falls konfiguriert
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.result_ttl_ms = int(result_ttl_sec * 1000)
+
+    # Eintrag nur löschen, wenn kein Follower mehr mitliest (atomar)
+    _ABANDON = (
+        "if tonumber(redis.call('GET', KEYS[4]) or '0') > 0 then return 0 end "
+        "redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4]) return 1"
+    )
+    # abgelaufenen Zähler nicht per DECR ohne TTL neu anlegen; 0 Follower = kein Schlüssel
+    _LEAVE = (
+        "if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end "
+        "local n = redis.call('DECR', KEYS[1]) "
+        "if n <= 0 then redis.call('DEL', KEYS[1]) end return n"
+    )
+
+    def _keys(self, key):
+        return (self.prefix + 'lock:' + key, self.prefix + 'chunks:' + key, self.prefix + 'state:' + key,
+                self.prefix + 'followers:' + key)
+
+    def acquire(self, key, lease_sec):
+        lock = self._keys(key)[0]
+        return bool(self._redis.set(lock, 1, nx=True, px=int(lease_sec * 1000)))
+
+    def renew(self, key, lease_sec):
+        lock, chunks, state, followers = self._keys(key)
+        if self._redis.exists(state):
+            return
+        lease_ms = int(lease_sec * 1000)
+        pipe = self._redis.pipeline()
+        for name in (lock, chunks, followers):
+            pipe.pexpire(name, lease_ms)
+        pipe.execute()
+
+    def join(self, key, lease_sec):
+        lock, _, _, followers = self._keys(key)
+        pipe = self._redis.pipeline()
+        pipe.incr(followers)
+        pipe.pexpire(followers, int(lease_sec * 1000))
+        pipe.exists(lock)
+        _, _, locked = pipe.execute()
+        return bool(locked)
+
+    def leave(self, key):
+        self._redis.eval(self._LEAVE, 1, self._keys(key)[3])
+
+    def abandon(self, key):
+        return bool(self._redis.eval(self._ABANDON, 4, *self._keys(key)))
+
+    def append(self, key, seq, text, lease_sec):
+        lock, chunks, _, _ = self._keys(key)
+        lease_ms = int(lease_sec * 1000)
+        pipe = self._redis.pipeline()
+        pipe.rpush(chunks, text)
+        pipe.pexpire(chunks, lease_ms)
+        pipe.pexpire(lock, lease_ms)
+        pipe.execute()
+
+    def finish(self, key, error=None, status_code=None):
+        lock, chunks, state, followers = self._keys(key)
+        pipe = self._redis.pipeline()
+        pipe.set(state, json.dumps({'error': error, 'status': status_code}), px=self.result_ttl_ms)
+        for name in (chunks, lock, followers):
+            pipe.pexpire(name, self.result_ttl_ms)
+        pipe.execute()
+
+    def release(self, key):
+        self._redis.delete(*self._keys(key))
+
+    def read(self, key, from_seq):
+        lock, chunks, state, _ = self._keys(key)
+        pipe = self._redis.pipeline()
+        pipe.get(state)
+        pipe.exists(lock)
+        pipe.lrange(chunks, from_seq, -1)
+        raw_state, locked, texts = pipe.execute()
+        texts = [t.decode('utf-8') for t in texts]
+        if raw_state is None:
+            return FlightState(texts, False, None, None, bool(locked))
+        result = json.loads(raw_state)
+        return FlightState(texts, True, result['error'], result['status'], True)
+
+
+def create_backend(name, sqlite_path=None, redis_url=None):
+    """Backend aus Konfiguration (memory | sqlite | redis); ``memory`` = nur innerhalb des Prozesses."""
+    name = (name or 'memory').lower()
+    if name == 'redis':
+        return RedisFlightBackend(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    if name == 'sqlite':
+        return SQLiteFlightBackend(sqlite_path or 'singleflight.sqlite3')
+    return None
@@ -69,7 +69,7 @@ document.addEventListener('DOMContentLoaded', function() {
         disableInput();
 
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -77,17 +77,38 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({ question: message })
             });
 
-            const data = await response.json();
-
-            if (response.ok) {
-                // Display AI response
-                hideTypingIndicator();
-                addMessage(data.answer, 'assistant');
-            } else {
+            if (!response.ok || !response.body) {
                 // Display error
+                const data = await response.json().catch(() => ({}));
                 hideTypingIndicator();
                 addMessage('Entschuldigung, es gab einen Fehler. Bitte versuchen Sie es erneut.', 'assistant');
                 console.error('Error:', data.error);
+                return;
+            }
+
+            // Display AI response token by token
+            let answer = '';
+            let textNode = null;
+            await readEventStream(response, function(event, data) {
+                if (event === 'token') {
+                    if (!textNode) {
+                        hideTypingIndicator();
+                        textNode = addMessage('', 'assistant');
+                    }
+                    answer += data.delta;
+                    textNode.innerHTML = formatMessage(answer);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event === 'error') {
+                    // e.g. moderation verdict arrived: discard streamed answer
+                    hideTypingIndicator();
+                    if (textNode) textNode.closest('.message').remove();
+                    textNode = addMessage('Entschuldigung, es gab einen Fehler. Bitte versuchen Sie es erneut.', 'assistant');
+                    console.error('Error:', data.error);
+                }
+            });
+            if (!textNode) {
+                hideTypingIndicator();
+                addMessage('Entschuldigung, es gab einen Fehler. Bitte versuchen Sie es erneut.', 'assistant');
             }
         } catch (error) {
             // Network error
@@ -99,6 +120,30 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Read a Server-Sent Events stream from a fetch response
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                raw.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+
     // Add message to chat
     function addMessage(content, sender) {
         const messageDiv = document.createElement('div');
@@ -119,6 +164,7 @@ document.addEventListener('DOMContentLoaded', function() {
             messageContent.appendChild(avatar);
             messageContent.appendChild(textSpan);
         }
+        const textNode = messageContent.querySelector('.msg-text');
 
         // Meta-Bereich (Timestamp + Copy)
         const meta = buildMessageMeta(messageContent);
@@ -129,6 +175,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return textNode;
     }
 
     function buildMessageMeta(container) {
@@ -0,0 +1,73 @@
+// AI-Sportverletzung-Assistant: ältere Verlaufseinträge per /api/history nachladen
+
+document.addEventListener('DOMContentLoaded', function() {
+    const historyList = document.getElementById('historyList');
+    const loadOlder = document.getElementById('loadOlder');
+    if (!historyList || !loadOlder) {
+        return;
+    }
+
+    // Ohne JavaScript bleibt der Link eine normale Seitennavigation
+    loadOlder.addEventListener('click', async function(e) {
+        e.preventDefault();
+        const cursor = loadOlder.getAttribute('data-next-cursor');
+        loadOlder.classList.add('disabled');
+        try {
+            const response = await fetch('/api/history?before=' + encodeURIComponent(cursor));
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            const data = await response.json();
+            data.items.forEach(item => historyList.appendChild(renderChat(item)));
+            if (data.next_cursor) {
+                loadOlder.setAttribute('data-next-cursor', data.next_cursor);
+                loadOlder.href = '/history?before=' + encodeURIComponent(data.next_cursor);
+                loadOlder.classList.remove('disabled');
+            } else {
+                loadOlder.parentElement.remove();
+            }
+        } catch (error) {
+            console.error('Verlauf konnte nicht geladen werden:', error);
+            window.location.href = loadOlder.href;
+        }
+    });
+
+    function renderChat(item) {
+        const col = element('div', 'col-md-6 mb-4');
+        const card = col.appendChild(element('div', 'card'));
+        const header = card.appendChild(element('div', 'card-header'));
+        const time = header.appendChild(element('small', 'text-muted'));
+        time.appendChild(element('i', 'fas fa-clock'));
+        time.appendChild(document.createTextNode(' ' + formatTimestamp(item.timestamp)));
+
+        const body = card.appendChild(element('div', 'card-body'));
+        body.appendChild(title('fas fa-question-circle text-primary', ' Ihre Frage:', 'card-title'));
+        body.appendChild(element('p', 'card-text', item.question));
+        body.appendChild(title('fas fa-robot text-success', ' AI-Antwort:', 'card-title mt-3'));
+        body.appendChild(element('div', 'ai-response', item.answer));
+        return col;
+    }
+
+    function title(icon, text, className) {
+        const heading = element('h6', className);
+        heading.appendChild(element('i', icon));
+        heading.appendChild(document.createTextNode(text));
+        return heading;
+    }
+
+    function element(tag, className, text) {
+        const node = document.createElement(tag);
+        node.className = className;
+        if (text !== undefined) {
+            node.textContent = text;
+        }
+        return node;
+    }
+
+    function formatTimestamp(timestamp) {
+        // Zeitstempel sind UTC ohne Offset, wie im serverseitig gerenderten Verlauf
+        const date = new Date(timestamp);
+        const pad = n => String(n).padStart(2, '0');
+        return `${pad(date.getDate())}.${pad(date.getMonth() + 1)}.${date.getFullYear()} ${pad(date.getHours())}:${pad(date.getMinutes())}`;
+    }
+});
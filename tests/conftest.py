@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Konfiguration vor dem Import von app.py (liest die Umgebung beim Import)
+_TMP = tempfile.mkdtemp(prefix='sportverletzung-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_TMP, 'test.db'),
+    'LOG_FILE': os.path.join(_TMP, 'server.log'),
+    'HISTORY_WRITE_BEHIND': '0',
+    'RATE_LIMIT_MAX': '1000',
+    'OPENAI_API_KEY': '',
+    'MODERATION_BLOCKLIST_FILE': '',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    application = app_module.app
+    with application.app_context():
+        app_module.db.create_all()
+        yield application
+        app_module.db.session.remove()
+        app_module.db.drop_all()
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from app import ChatHistory, ConversationSummary, db, load_conversation_context
+from history_writer import PendingChat
+
+
+def _user():
+    app_module._upsert_user('test-user')
+    return app_module._load_user('test-user')
+
+
+def _add_turns(user, count, start=0):
+    base = datetime(2024, 1, 1)
+    for i in range(start, start + count):
+        db.session.add(ChatHistory(chat_id=f'chat-{i}', user_id=user.id, question=f'Frage Nummer {i}',
+                                   answer=f'Kurze Antwort zu Frage {i} mit einem Satz.',
+                                   timestamp=base + timedelta(minutes=i)))
+    db.session.commit()
+
+
+def test_turns_beyond_fetch_limit_reach_summary(app):
+    user = _user()
+    total = app_module.HISTORY_FETCH_LIMIT + 5
+    _add_turns(user, total)
+
+    history_items, summary = load_conversation_context(user)
+
+    # kurze Runden: alle geladenen passen ins Budget, die älteren fehlen im Prompt
+    assert len(history_items) == app_module.HISTORY_FETCH_LIMIT
+    assert 'Frage Nummer 0' in summary
+    assert 'Frage Nummer 4' in summary
+    assert 'Frage Nummer 5' not in summary
+    row = db.session.get(ConversationSummary, user.id)
+    assert row.last_chat_pk == history_items[0].id - 1
+
+
+def test_summary_is_extended_incrementally(app):
+    user = _user()
+    _add_turns(user, app_module.HISTORY_FETCH_LIMIT + 1)
+    load_conversation_context(user)
+    _add_turns(user, 2, start=app_module.HISTORY_FETCH_LIMIT + 1)
+
+    _, summary = load_conversation_context(user)
+
+    lines = summary.splitlines()
+    assert [line.split(' →')[0] for line in lines] == [f'- Frage: Frage Nummer {i}' for i in range(3)]
+
+
+def test_stable_parts_precede_rag_context(app, monkeypatch):
+    rag = {'role': 'system', 'content': 'Leitlinien-Auszug'}
+    monkeypatch.setattr(app_module, '_retrieve_context', lambda question: [rag])
+    turn = ChatHistory(chat_id='chat-1', question='Erste Frage', answer='Erste Antwort')
+
+    messages = app_module._build_messages('Neue Frage', [turn], summary='- Frage: Alt')
+
+    assert messages[0] is app_module.system_prompt.message
+    assert messages[1]['content'].endswith('- Frage: Alt')
+    assert [m['content'] for m in messages[2:]] == ['Erste Frage', 'Erste Antwort', 'Leitlinien-Auszug', 'Neue Frage']
+
+
+class _FlushingWriter:
+    """Zeilen sind schon committet, stehen aber noch in ``_inflight`` (Fenster nach dem Commit)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def pending_for(self, user_id):
+        return [PendingChat(None, **row) for row in reversed(self.rows)]
+
+
+def test_committed_inflight_turn_appears_once(app, monkeypatch):
+    user = _user()
+    _add_turns(user, 2)
+    committed = db.session.get(ChatHistory, 2)
+    rows = [dict(chat_id=committed.chat_id, user_id=user.id, question=committed.question,
+                 answer=committed.answer, timestamp=committed.timestamp),
+            dict(chat_id='chat-pending', user_id=user.id, question='Noch nicht geschrieben',
+                 answer='Antwort', timestamp=datetime(2024, 1, 2))]
+    monkeypatch.setattr(app_module, 'history_writer', _FlushingWriter(rows))
+
+    history_items, _ = load_conversation_context(user)
+
+    assert [item.chat_id for item in history_items] == ['chat-0', 'chat-1', 'chat-pending']
+    assert history_items[1].id == committed.id
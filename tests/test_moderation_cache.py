@@ -0,0 +1,77 @@
+import concurrent.futures
+
+import pytest
+
+import app as app_module
+
+ALLOWED = (False, '')
+BLOCKED = (True, 'test')
+
+
+class FakeProvider:
+    """Antwortet sofort; entscheidet die Moderation erst während der Generierung."""
+
+    name = 'fake'
+    model = 'fake-model'
+
+    def __init__(self, verdicts):
+        self.verdicts = verdicts
+        self.calls = 0
+
+    def _resolve(self):
+        self.calls += 1
+        self.verdicts.pop(0).set_result(self.verdict)
+
+    async def complete(self, messages):
+        self._resolve()
+        return 'Antwort des Modells'
+
+    async def stream(self, messages):
+        self._resolve()
+        for part in ('Antwort ', 'des ', 'Modells'):
+            yield part
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    verdicts = []
+    provider = FakeProvider(verdicts)
+
+    def start_moderation(text):
+        future = concurrent.futures.Future()
+        verdicts.append(future)
+        return future
+
+    monkeypatch.setattr(app_module, 'get_provider', lambda: provider)
+    monkeypatch.setattr(app_module, 'start_moderation', start_moderation)
+    monkeypatch.setattr(app_module, 'response_cache', app_module.ResponseCache(max_entries=16, ttl_sec=60))
+    app_module.response_cache_scope.cache_clear()
+    yield app.test_client(), provider
+    app_module.response_cache_scope.cache_clear()
+
+
+@pytest.mark.parametrize('path', ['/chat', '/chat/stream'])
+def test_blocked_answer_is_not_cached(client, path):
+    http, provider = client
+    provider.verdict = BLOCKED
+
+    response = http.post(path, json={'question': 'Wie behandle ich eine Zerrung?'})
+
+    assert b'Moderation' in response.get_data()
+    assert app_module.response_cache.stats()['entries'] == 0
+    provider.verdict = ALLOWED
+    http.post(path, json={'question': 'Wie behandle ich eine Zerrung?'}).get_data()
+    assert provider.calls == 2
+
+
+@pytest.mark.parametrize('path', ['/chat', '/chat/stream'])
+def test_allowed_answer_is_cached(client, path):
+    http, provider = client
+    provider.verdict = ALLOWED
+
+    response = http.post(path, json={'question': 'Wie behandle ich eine Zerrung?'})
+
+    assert response.status_code == 200
+    assert b'Antwort' in response.get_data()  # Stream vollständig lesen
+    answer, tier = app_module.response_cache.get('Wie behandle ich eine Zerrung?', app_module.response_cache_scope())
+    assert (answer, tier) == ('Antwort des Modells', 'exact')
@@ -0,0 +1,22 @@
+from response_cache import ResponseCache
+
+QUESTION = 'Was hilft gegen Knieschmerzen nach dem Joggen im Winter?'
+
+
+def test_similar_question_hits():
+    cache = ResponseCache(similarity_threshold=0.8)
+    cache.put(QUESTION, 'scope', 'Antwort')
+
+    assert cache.get('Was hilft gegen Knieschmerzen nach dem Joggen im Winter', 'scope') == ('Antwort', 'exact')
+    assert cache.get('Was hilft bei Knieschmerzen nach dem Joggen im Winter?', 'scope') == ('Antwort', 'similar')
+    assert cache.get('Was hilft bei Knieschmerzen nach dem Joggen im Winter?', 'other') == (None, None)
+
+
+def test_candidates_are_capped_and_prefer_rare_terms():
+    cache = ResponseCache(max_entries=2000, similarity_threshold=0.8, max_candidates=8)
+    for i in range(1000):
+        cache.put(f'Was hilft nach dem Training Nummer {i}?', 'scope', f'Antwort {i}')
+    cache.put(QUESTION, 'scope', 'Knie')
+
+    assert cache.get('Was hilft bei Knieschmerzen nach dem Joggen im Winter?', 'scope') == ('Knie', 'similar')
+    assert len(cache._candidates({'w:was': 1, 'w:hilft': 1}, 'scope', 0)) == 8
@@ -0,0 +1,129 @@
+"""Cache für die Zuordnung Session-``user_id`` -> (``User.id``, Sprache).
+
+Jede Anfrage braucht die interne ID des Nutzers. Statt sie jedes Mal per Query
+zu holen, hält jeder Prozess einen LRU mit TTL; optional liegt dahinter ein
+gemeinsamer Redis-Cache (neue Worker und Nodes fragen dann ebenfalls nicht
+die Datenbank). Schreibzugriffe auf einen Nutzer invalidieren den Eintrag;
+in anderen Prozessen begrenzt die TTL, wie lange ein alter Wert sichtbar bleibt.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+CachedUser = namedtuple('CachedUser', ['id', 'user_id', 'language'])
+
+
+class RedisUserStore:
+    """Gemeinsamer Cache in Redis (ein GET pro lokalem Fehlschlag)."""
+
+    def __init__(self, url, ttl_sec=300, prefix='user:'):
+        import redis  # optionaler Import, nur falls konfiguriert
+        self._redis = redis.Redis.from_url(url)
+        self.ttl_sec = ttl_sec
+        self.prefix = prefix
+
+    def get(self, user_id):
+        raw = self._redis.get(self.prefix + user_id)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CachedUser(data['id'], user_id, data['language'])
+
+    def set(self, user):
+        payload = json.dumps({'id': user.id, 'language': user.language})
+        self._redis.set(self.prefix + user.user_id, payload, ex=self.ttl_sec)
+
+    def delete(self, user_id):
+        self._redis.delete(self.prefix + user_id)
+
+
+def create_store(name, redis_url=None, ttl_sec=300):
+    """Gemeinsamer Cache aus Konfiguration (memory | redis); ``memory`` = nur der lokale LRU."""
+    name = (name or 'memory').lower()
+    if name == 'redis':
+        return RedisUserStore(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'), ttl_sec)
+    return None
+
+
+class UserCache:
+    """Thread-sicherer LRU/TTL-Cache mit optionalem gemeinsamem Store."""
+
+    def __init__(self, max_entries=10000, ttl_sec=300, store=None):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.store = store
+        self._entries = OrderedDict()  # user_id -> (CachedUser, expires_at)
+        self._lock = threading.Lock()
+        self.counters = Counter(hits=0, shared_hits=0, misses=0, stores=0, invalidations=0, evictions=0,
+                                shared_errors=0)
+
+    def get(self, user_id):
+        """CachedUser oder None (dann aus der Datenbank laden und ``put``)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    self.counters['hits'] += 1
+                    return entry[0]
+                del self._entries[user_id]
+        user = None
+        if self.store is not None:
+            try:
+                user = self.store.get(user_id)
+            except Exception:
+                self.counters['shared_errors'] += 1  # gemeinsamer Cache ist optional
+        if user is None:
+            with self._lock:
+                self.counters['misses'] += 1
+            return None
+        with self._lock:
+            self.counters['shared_hits'] += 1
+        self._put_local(user)
+        return user
+
+    def put(self, user):
+        self._put_local(user)
+        if self.store is not None:
+            try:
+                self.store.set(user)
+            except Exception:
+                self.counters['shared_errors'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.counters['invalidations'] += 1
+        if self.store is not None:
+            try:
+                self.store.delete(user_id)
+            except Exception:
+                self.counters['shared_errors'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _put_local(self, user):
+        with self._lock:
+            self._entries[user.user_id] = (user, time.monotonic() + self.ttl_sec)
+            self._entries.move_to_end(user.user_id)
+            self.counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters['hits'] + counters['shared_hits'] + counters['misses']
+        counters.update(
+            entries=size,
+            hit_ratio=round((counters['hits'] + counters['shared_hits']) / lookups, 4) if lookups else 0.0,
+            shared=self.store is not None,
+        )
+        return counters